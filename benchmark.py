@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+"""Benchmark suite: generates synthetic statements for all supported csv formats and times
+the ingest, move, category change and export steps, writing the results to a json file."""
+
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+from datetime import date, timedelta
+
+from export import writeExport
+from journal import JOURNAL_FILE, KeyIndex, SessionJournal, actionRecord
+from rowtable import RowView, dateOrder, moveRows, setCategories
+from schemas import SCHEMAS
+from totals import Totals
+from transaction import isTransaction
+from utils import formatRow, readInputData
+
+# merchants used for the synthetic descriptions
+MERCHANTS = ["STARBUCKS #{}", "WHOLE FOODS MKT {}", "AMAZON MKTP US*{}", "SHELL OIL {}", "TRADER JOE'S #{}",
+             "UBER TRIP {}", "NETFLIX.COM", "SPOTIFY USA", "CVS/PHARMACY #{}", "PAYROLL DEPOSIT", "RENT PAYMENT",
+             "COSTCO WHSE #{}", "CHEVRON {}", "TARGET T-{}", "VENMO PAYMENT {}"]
+# default sizes (number of rows per format)
+SIZES = [1000, 10000, 100000, 1000000]
+# default folder for the synthetic statements (generated once, then reused) and the results
+DATA_DIR = os.path.join(os.path.expanduser("~"), ".cache", "spreadsheet-gui", "benchmark")
+
+
+def generateStatement(path, schema, num_rows, seed=0):
+    """Function to write a synthetic statement with num_rows rows in the csv format of schema."""
+
+    rng = random.Random(seed)
+    num_cols = len(schema.header.split(","))
+    start = date(2020, 1, 1)
+    with open(path, "w", newline="") as fout:
+        csv_writer = csv.writer(fout)
+        csv_writer.writerow(schema.header.split(","))
+        for _ in range(num_rows):
+            row = [""] * num_cols
+            row[schema.date_col] = (start + timedelta(days=rng.randrange(1500))).strftime(schema.date_fmt)
+            row[schema.desc_col] = rng.choice(MERCHANTS).format(rng.randrange(1000))
+            # amount as written by the bank: debit -, credit + after applying the sign of the schema
+            amount = round(rng.lognormvariate(3, 1.2), 2) * (1 if rng.random() < 0.1 else -1)
+            if schema.credit_col is not None and amount > 0:
+                row[schema.credit_col] = f"{amount:.2f}"
+            else:
+                row[schema.amount_col] = f"{schema.sign * amount:.2f}"
+            csv_writer.writerow(row)
+
+def generateData(data_dir, num_rows, seed=0):
+    """Function to write one synthetic statement per registered csv format, each in its own folder
+    inside data_dir (so it can be read by readInputData). Existing statements are reused.
+    Returns the paths of the files, keyed by format name."""
+
+    paths = {}
+    for i, schema in enumerate(SCHEMAS.values()):
+        file_dir = os.path.join(data_dir, str(num_rows), schema.name)
+        os.makedirs(file_dir, exist_ok=True)
+        paths[schema.name] = os.path.join(file_dir, f"{schema.name}.csv")
+        if not os.path.exists(paths[schema.name]):
+            generateStatement(paths[schema.name], schema, num_rows, seed=seed + i)
+    return paths
+
+def timeit(func, repeat=3, setup=None):
+    """Function to get the best wall time (in seconds) of func over repeat runs.
+    setup, if given, is called before each run (untimed) and its result is passed to func."""
+
+    best = float("inf")
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        if setup is not None:
+            func(arg)
+        else:
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def createWindow():
+    """Function to create a withdrawn Window, or None if tkinter or a display is not available."""
+
+    try:
+        from window import Window
+        window = Window()
+    except Exception:
+        return None
+    window.withdraw()
+    window.create_gui()
+    return window
+
+def benchFormat(name, path, num_rows, repeat, tk_mode=False):
+    """Function to run all benchmarks on one synthetic statement, on the Window methods if tk_mode
+    (needs a display) or else on the pure functions. Returns a list of result dicts."""
+
+    results = []
+
+    def record(bench, seconds, **extra):
+        results.append({"bench": bench, "format": name, "rows": num_rows, "seconds": round(seconds, 6), **extra})
+        print(f"{bench:>16} {name:>15} {num_rows:>8} rows: {seconds:.4f}s")
+
+    # ingest: the whole pipeline, and the row mapping alone on the raw csv rows
+    file_dir = os.path.dirname(path)
+    record("readInputData", timeit(lambda: readInputData(file_dir), repeat))
+    with open(path) as fin:
+        csv_reader = csv.reader(fin)
+        header = ",".join(next(csv_reader))
+        raw_rows = list(csv_reader)
+    record("formatRow", timeit(lambda: [formatRow(row, header, 50) for row in raw_rows], repeat))
+
+    list_in, format_dict = readInputData(file_dir)
+    positions = [i for i, item in enumerate(list_in) if isTransaction(item)]
+    # selections: a few rows (moved one by one) and half of the rows (moved in one pass)
+    small = positions[::max(len(positions) // 50, 1)][:50]
+    half = positions[::2]
+
+    if not tk_mode:
+        # the functions behind the Window methods, on the same state: rows in the input view (file order),
+        # output view sorted by date, totals of the output list and session journal with the stable row keys
+        rows = [row for row in list_in if isTransaction(row)]
+        for rid, row in enumerate(rows):
+            row.rid = rid
+        slots = [row.rid if isTransaction(row) else row for row in list_in if row != ""]
+        row_keys = KeyIndex()
+        row_keys.add(rows)
+        journal_path = os.path.join(file_dir, JOURNAL_FILE)
+
+        def setupState():
+            in_output = bytearray(len(rows))
+            view_in = RowView(rows)
+            view_in.reset(slots, [1] * len(slots))
+            view_out = RowView(rows)
+            view_out.reset(*dateOrder(rows, in_output))
+            if os.path.exists(journal_path):
+                os.remove(journal_path)
+            return in_output, view_in, view_out, Totals(), SessionJournal(journal_path)
+
+        def moveSelection(state, selection):
+            in_output, view_in, view_out, totals, journal = state
+            rids = moveRows([row.rid for row in view_in.rows_at(selection)], "in_to_out", rows, in_output,
+                            view_in, view_out, totals)
+            journal.append(actionRecord(row_keys, ("move", "in_to_out", rids)))
+
+        # the date order of the output view, rebuilt after an import
+        record("_sync_output", timeit(lambda: dateOrder(rows, bytearray(len(rows))), repeat), mode="pure")
+        for label, selection in (("small", small), ("half", half)):
+            record("_move_items", timeit(lambda state: moveSelection(state, selection), repeat, setup=setupState),
+                   selection=label, mode="pure")
+        state = setupState()
+        moveSelection(state, half)
+        in_output, _, view_out, totals, journal = state
+        out_positions = list(range(len(view_out) - 1))
+
+        def changeCategory(category):
+            rids = [row.rid for row in view_out.rows_at(out_positions)]
+            old_cats = [rows[rid].category for rid in rids]
+            new_cats = [category] * len(rids)
+            setCategories(rids, new_cats, rows, in_output, totals)
+            journal.append(actionRecord(row_keys, ("cat", rids, new_cats, old_cats)))
+
+        record("_change_category", timeit(lambda: changeCategory("Rent"), repeat), selection="half", mode="pure")
+        f_out = os.path.join(file_dir, "exported_items.csv")
+        record("_export_all", timeit(lambda: writeExport(rows, f_out), repeat), mode="pure")
+        return results
+
+    # Window methods on a fresh withdrawn root (so earlier runs do not add rows to it): import the rows once,
+    # then move them all back before each run
+    window = createWindow()
+    try:
+        window.importData(list_in, format_dict)
+
+        def setupWindow():
+            window._move_rows(window.list_out.visible_rids(), "out_to_in")
+
+        for label, selection in (("small", small), ("half", half)):
+            def moveSelection(_, selection=selection):
+                window.listbox_in.selected = set(selection)
+                window._move_items_dir()
+                # include the redraw, which runs on the next idle turn
+                window.update_idletasks()
+            record("_move_items", timeit(moveSelection, repeat, setup=setupWindow), selection=label, mode="tk")
+        setupWindow()
+        window.listbox_in.selected = set(half)
+        window._move_items_dir()
+        out_positions = set(range(len(window.list_out) - 1))
+
+        def changeCategory():
+            window.listbox_out.selected = set(out_positions)
+            window._change_category("Rent")
+            window.update_idletasks()
+
+        record("_change_category", timeit(changeCategory, repeat), selection="half", mode="tk")
+        f_out = os.path.join(file_dir, "exported_items.csv")
+
+        def exportAll():
+            window._export_all(f_out)
+            window.export_thread.join()
+
+        record("_export_all", timeit(exportAll, repeat), mode="tk")
+    finally:
+        window.destroy()
+    return results
+
+def parseArgs():
+    """Function to parse the command line arguments."""
+
+    parser = argparse.ArgumentParser(description="Benchmark the ingest, move, category change and export steps.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES,
+                        help="number of rows per synthetic statement (default: 1000 10000 100000 1000000)")
+    parser.add_argument("--formats", nargs="+", default=None,
+                        help="csv formats to benchmark (default: all registered formats)")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs per benchmark, the best is kept")
+    parser.add_argument("--data-dir", default=None,
+                        help=f"folder for the synthetic statements, reused across runs (default: {DATA_DIR})")
+    parser.add_argument("--pure", action="store_true",
+                        help="benchmark the pure functions instead of the Window methods, even if a display is available")
+    parser.add_argument("--out", default=None,
+                        help="json file for the results (default: benchmark-VERSION.json in the data folder)")
+
+    return parser.parse_args()
+
+def gitVersion():
+    """Function to get the git commit of the code being benchmarked, if available."""
+
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+if __name__ == "__main__":
+    args = parseArgs()
+    data_dir = args.data_dir if args.data_dir is not None else DATA_DIR
+    version = gitVersion()
+    # one results file per version, next to the statements
+    out = args.out if args.out is not None else os.path.join(data_dir, f"benchmark-{version or 'unknown'}.json")
+    # the Window methods need a display, fall back to the pure functions without one
+    probe = None if args.pure else createWindow()
+    tk_mode = probe is not None
+    if tk_mode:
+        probe.destroy()
+    else:
+        print("Benchmarking the pure functions (no display or --pure)")
+
+    results = []
+    for num_rows in args.sizes:
+        paths = generateData(data_dir, num_rows)
+        for name, path in paths.items():
+            if args.formats is None or name in args.formats:
+                results.extend(benchFormat(name, path, num_rows, args.repeat, tk_mode=tk_mode))
+
+    report = {
+        "version": version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "mode": "tk" if tk_mode else "pure",
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(out, "w") as fout:
+        json.dump(report, fout, indent=2)
+    print(f"Results written to {out}")
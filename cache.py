@@ -0,0 +1,113 @@
+"""Persistent on-disk cache of parsed input files, so unchanged statements are not parsed again."""
+
+import hashlib
+import os
+import pickle
+
+from transaction import rowsFromColumns, rowsToColumns
+
+# bump when the parsing of the input files changes, to invalidate the cached entries
+PARSER_VERSION = 5
+
+
+class ParseCache:
+    """Cache holding the parsed rows of each input file in a local directory.
+    Entries are keyed by file path and checked against the size, mtime and content hash of the file.
+    The total size of the cache is bounded, with the least recently used entries evicted first."""
+
+    def __init__(self, cache_dir=None, max_bytes=256 * 1024**2):
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "spreadsheet-gui")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_path(self, input_file, desc_len):
+        """Function to get the path of the cache entry for an input file."""
+
+        key = f"{os.path.abspath(input_file)}|{desc_len}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest() + ".pkl")
+
+    @staticmethod
+    def _file_hash(input_file):
+        """Function to compute the hash of the content of a file."""
+
+        digest = hashlib.sha1()
+        with open(input_file, "rb") as fin:
+            for chunk in iter(lambda: fin.read(1024**2), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get(self, input_file, desc_len):
+        """Function to get the cached rows of input_file, or None if there is no valid entry."""
+
+        entry_path = self._entry_path(input_file, desc_len)
+        try:
+            with open(entry_path, "rb") as fin:
+                entry = pickle.load(fin)
+            stat = os.stat(input_file)
+        except (OSError, pickle.PickleError, EOFError, AttributeError, KeyError):
+            return None
+        if entry["version"] != PARSER_VERSION or entry["size"] != stat.st_size:
+            return None
+        try:
+            # only hash the file if it was touched since the entry was written
+            if entry["mtime"] != stat.st_mtime_ns:
+                if entry["hash"] != self._file_hash(input_file):
+                    return None
+                entry["mtime"] = stat.st_mtime_ns
+                self._write(entry_path, entry)
+            else:
+                # mark the entry as recently used, for the eviction
+                os.utime(entry_path)
+        except OSError:
+            pass
+        return rowsFromColumns(entry["columns"])
+
+    def put(self, input_file, desc_len, rows):
+        """Function to store the parsed rows of input_file in the cache.
+        Failing to write the cache is not an error, the file is simply parsed again next time."""
+
+        try:
+            stat = os.stat(input_file)
+            entry = {
+                "version": PARSER_VERSION,
+                "path": os.path.abspath(input_file),
+                "size": stat.st_size,
+                "mtime": stat.st_mtime_ns,
+                "hash": self._file_hash(input_file),
+                # rows are stored as columns, which are much faster to (un)pickle
+                "columns": rowsToColumns(rows),
+            }
+            self._write(self._entry_path(input_file, desc_len), entry)
+            self._evict()
+        except OSError:
+            pass
+
+    def _write(self, entry_path, entry):
+        """Function to write a cache entry atomically (via a temp file)."""
+
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as fout:
+            pickle.dump(entry, fout, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, entry_path)
+
+    def _evict(self):
+        """Function to remove the least recently used entries until the cache fits in max_bytes."""
+
+        entries = []
+        total = 0
+        for item in os.scandir(self.cache_dir):
+            if item.name.endswith(".pkl"):
+                stat = item.stat()
+                entries.append((stat.st_mtime, stat.st_size, item.path))
+                total += stat.st_size
+        # oldest entries first
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
@@ -0,0 +1,84 @@
+"""Detection of duplicate transactions across input files (e.g. overlapping statement exports)."""
+
+# supported ways to handle the duplicates
+DUPLICATE_MODES = ("drop", "flag", "keep")
+
+
+def duplicateKey(row):
+    """Function to get the normalized (date, description, amount in cents, source, account) key of a row.
+    Rows of different cards, for the formats with a card number column, are never duplicates of each other;
+    for the other formats the account is empty, so rows of all the files of the same format are matched."""
+
+    return (row.date, " ".join(row.desc.lower().split()), round(row.amount * 100), row.source, row.account)
+
+
+class DuplicateFilter:
+    """Filter for the rows coming out of iterInputData, applied in a single pass over all files.
+    Identical rows within one file are genuine repeated purchases and are always kept. A row in a later
+    file is a duplicate if an earlier file already had at least as many copies of the same key,
+    e.g. the k-th coffee of a day is only dropped if another file also had k such coffees.
+    Depending on mode, duplicates are dropped, flagged (row.dup) or kept as is.
+    The copies of the files given by name are remembered, so that a file can be forgotten when it changes."""
+
+    def __init__(self, mode="flag"):
+        if mode not in DUPLICATE_MODES:
+            raise ValueError(f"Unsupported duplicates mode: {mode}")
+        self.mode = mode
+        # max number of copies of each key seen in any previous file, and the counts for the current file
+        self.seen = {}
+        self.current = {}
+        # counts and number of duplicates of each named file
+        self.file_counts = {}
+        self.file_duplicates = {}
+        self.current_duplicates = 0
+        # number of duplicates found so far
+        self.num_duplicates = 0
+
+    def __call__(self, rows, file_done, name=None):
+        """Function to filter the next batch of rows of the current file.
+        file_done marks the last batch of the file, named name if it may be forgotten later (see forget)."""
+
+        if self.mode == "keep":
+            return rows
+        seen = self.seen
+        current = self.current
+        kept = []
+        for row in rows:
+            key = duplicateKey(row)
+            count = current[key] = current.get(key, 0) + 1
+            if count <= seen.get(key, 0):
+                self.current_duplicates += 1
+                if self.mode == "drop":
+                    continue
+                row.dup = True
+            kept.append(row)
+        if file_done:
+            # the copies of this file are available to match rows of the following files
+            for key, count in current.items():
+                if count > seen.get(key, 0):
+                    seen[key] = count
+            if name is not None:
+                self.file_counts[name] = current
+                self.file_duplicates[name] = self.current_duplicates
+            self.num_duplicates += self.current_duplicates
+            self.current = {}
+            self.current_duplicates = 0
+        return kept
+
+    def forget(self, name):
+        """Function to remove the copies of a named file (e.g. modified or removed), so that its rows no
+        longer match the rows of the files filtered next."""
+
+        counts = self.file_counts.pop(name, None)
+        if counts is None:
+            return
+        self.num_duplicates -= self.file_duplicates.pop(name)
+        # the other files may have as many copies of a key
+        others = self.file_counts.values()
+        seen = self.seen
+        for key in counts:
+            count = max((other.get(key, 0) for other in others), default=0)
+            if count:
+                seen[key] = count
+            else:
+                del seen[key]
@@ -0,0 +1,161 @@
+"""Functions to export the selected rows to the output csv file."""
+
+import csv
+import io
+import os
+from collections import Counter
+from functools import partial
+
+from stats import STATS
+from utils import formatDate
+
+# registry of the export formats: export_fmt -> (label, function mapping a row to the output fields)
+EXPORT_FORMATS = {}
+# output fields identifying the transaction of a row (date, description, amount) and the field of its category,
+# at the same place in all the registered formats
+KEY_FIELDS = (1, 0, 4)
+CATEGORY_FIELD = 2
+# rows formatted per chunk, so that the memory used by the export strings stays bounded
+EXPORT_CHUNK = 50000
+
+
+def registerExportFormat(export_fmt, label, rowFields):
+    """Function to register an export format. rowFields(row, date, category, amount) returns the
+    list of fields written for a row, given the formatted date, (sign-flipped) amount and category."""
+    
+    EXPORT_FORMATS[export_fmt] = (label, rowFields)
+
+def budgetFields(row, date, category, amount, amount_idx=6):
+    """Function to map a row to the fields of the budget spreadsheet, with the amount
+    duplicated in the column amount_idx (depends on the export format)."""
+    
+    # construct list with new fields to write in output file
+    new_fields = [""] * 7
+    new_fields[0] = row.desc
+    new_fields[1] = date
+    new_fields[2] = category
+    # add default value for purchase method
+    new_fields[3] = "cc"
+    new_fields[4] = amount
+    new_fields[amount_idx] = amount
+    # special case: monthly gift
+    if category == "Monthly Gift":
+        new_fields[amount_idx] = ""
+    
+    return new_fields
+
+def iterExportFields(rows, export_fmt=1, categories=None):
+    """Generator of the output fields of the rows, formatted one chunk at a time.
+    categories optionally gives a snapshot of the row categories (e.g. taken before a background export)."""
+    
+    _, rowFields = EXPORT_FORMATS[export_fmt]
+    for start in range(0, len(rows), EXPORT_CHUNK):
+        chunk = rows[start:start + EXPORT_CHUNK]
+        # change date format (cached, dates repeat a lot) and fix sign for amount fields
+        dates = [formatDate(row.date) for row in chunk]
+        amounts = [f"{-1 * row.amount:.2f}" for row in chunk]
+        cats = [row.category for row in chunk] if categories is None else categories[start:start + EXPORT_CHUNK]
+        yield from map(rowFields, chunk, dates, cats, amounts)
+
+@STATS.timed("export")
+def writeExport(rows, f_out, export_fmt=1, categories=None):
+    """Function to export rows to the csv file f_out, using one of the registered export formats.
+    The rows are streamed to a temp file next to f_out, which then replaces f_out in one step,
+    so an existing output file is never left half written."""
+    
+    if export_fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_fmt}")
+    tmp_path = f"{f_out}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", newline="", buffering=1024**2) as fout:
+            # csv writer quotes the fields containing commas or quotes
+            csv_writer = csv.writer(fout, lineterminator="\n")
+            csv_writer.writerows(iterExportFields(rows, export_fmt, categories))
+        os.replace(tmp_path, f_out)
+    except BaseException:
+        # do not leave the partial temp file behind
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def exportedIndex(f_out):
+    """Function to count the rows already in the output file f_out, keyed by their transaction fields (see
+    KEY_FIELDS), in one streaming pass. Returns the counts of the transactions and of the (transaction, category)
+    pairs, empty if the file does not exist."""
+    
+    transactions = Counter()
+    categorized = Counter()
+    try:
+        with open(f_out, newline="", buffering=1024**2) as fin:
+            for fields in csv.reader(fin):
+                # skip the empty or short lines
+                if len(fields) <= max(*KEY_FIELDS, CATEGORY_FIELD):
+                    continue
+                key = tuple(fields[i] for i in KEY_FIELDS)
+                transactions[key] += 1
+                categorized[key, fields[CATEGORY_FIELD]] += 1
+    except FileNotFoundError:
+        pass
+    return transactions, categorized
+
+def findNewRows(rows, f_out, export_fmt=1, categories=None, changed=None):
+    """Function to get the output fields of the rows that are not in the output file f_out yet.
+    Rows are matched on their transaction (date, description, amount) only, so the export format does not matter.
+    Identical rows are counted: if the file has k copies of a row, its first k copies are already exported.
+    The fields of the exported rows whose category changed since are added to changed, if given."""
+    
+    if export_fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {export_fmt}")
+    transactions, categorized = exportedIndex(f_out)
+    new_rows = []
+    for fields in iterExportFields(rows, export_fmt, categories):
+        key = tuple(fields[i] for i in KEY_FIELDS)
+        if transactions[key] == 0:
+            new_rows.append(fields)
+            continue
+        transactions[key] -= 1
+        # already exported, check the category of one of its copies
+        if categorized[key, fields[CATEGORY_FIELD]] > 0:
+            categorized[key, fields[CATEGORY_FIELD]] -= 1
+        elif changed is not None:
+            changed.append(fields)
+    return new_rows
+
+@STATS.timed("export_append")
+def appendExport(rows, f_out, export_fmt=1, categories=None, changed=None):
+    """Function to append to the csv file f_out only the rows that are not in it yet (see findNewRows),
+    instead of rewriting the whole file. The new rows are written in one go; if that fails, the file is
+    truncated back to its previous size. Exported rows with another category are added to changed, if given.
+    Returns the number of appended rows."""
+    
+    new_rows = findNewRows(rows, f_out, export_fmt, categories, changed)
+    if not new_rows:
+        return 0
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(new_rows)
+    size = os.path.getsize(f_out) if os.path.exists(f_out) else None
+    prefix = ""
+    if size:
+        # the last row of the file may lack its line break
+        with open(f_out, "rb") as fin:
+            fin.seek(size - 1)
+            if fin.read(1) not in (b"\n", b"\r"):
+                prefix = "\n"
+    try:
+        with open(f_out, "a", newline="") as fout:
+            fout.write(prefix + buffer.getvalue())
+            fout.flush()
+            os.fsync(fout.fileno())
+    except BaseException:
+        # do not leave a partial row at the end of the file (or a new file with only part of the rows)
+        if size is None:
+            if os.path.exists(f_out):
+                os.remove(f_out)
+        elif os.path.exists(f_out):
+            os.truncate(f_out, size)
+        raise
+    return len(new_rows)
+
+# export formats of the budget spreadsheet, the amount is duplicated in a different column
+registerExportFormat(1, "Export 1", partial(budgetFields, amount_idx=6))
+registerExportFormat(2, "Export 2", partial(budgetFields, amount_idx=5))
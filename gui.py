@@ -1,13 +1,92 @@
 #!/usr/bin/env python
 
+import argparse
+import atexit
 import os
 import sys
-from tkinter.filedialog import askdirectory
+from datetime import date
 
-from utils import readInputData
-from window import Window
+from cache import ParseCache
+from dedup import DUPLICATE_MODES
+from export import EXPORT_FORMATS
+from history import HistoryStore
+from rules import RuleEngine
+from search import parseRange
+from stats import ENV_FILE_VAR, ENV_VAR, STATS
 
-if __name__ == "__main__":
+
+def parseArgs():
+    """Function to parse the command line arguments."""
+    
+    parser = argparse.ArgumentParser(description="GUI to select and export rows from csv files.")
+    parser.add_argument("input_dir", nargs="?", default=None,
+                        help="folder with the input csv files (a folder picker is shown if omitted)")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="number of processes used to parse the input files in parallel (default: 1)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="folder for the cache of parsed input files (default: ~/.cache/spreadsheet-gui)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always parse all input files, without using the cache")
+    parser.add_argument("--duplicates", choices=DUPLICATE_MODES, default=None,
+                        help="what to do with rows repeated across input files (default: flag, or drop in "
+                             "headless mode, where flagged rows can not be told apart in the output file)")
+    parser.add_argument("--rules", default=None,
+                        help="toml or json file with rules to set the category of the rows at import")
+    parser.add_argument("--watch", action="store_true",
+                        help="poll input_dir for new, modified or removed csv files and update the input list")
+    parser.add_argument("--lazy", action="store_true",
+                        help="memory-map the input files and parse the rows only when used, for very large "
+                             "statements (no duplicates check, session journal or watch mode)")
+    parser.add_argument("--history", default=None,
+                        help="sqlite file where the imported rows and their categories are kept across sessions")
+    parser.add_argument("--history-range", default=None, metavar="FROM..TO",
+                        help="open the rows of this date range (e.g. 2021-01-01..2023-12-31, either end can be left "
+                             "out) from the --history file instead of input_dir")
+    parser.add_argument("--stats", action="store_true",
+                        help=f"record call counts and timings of the hot paths (also enabled by {ENV_VAR}=1)")
+    parser.add_argument("--stats-file", default=os.environ.get(ENV_FILE_VAR),
+                        help=f"json file where the stats are written at exit, implies --stats (default: ${ENV_FILE_VAR})")
+    parser.add_argument("--headless", action="store_true",
+                        help="export all rows of input_dir without opening the GUI (does not need a display)")
+    parser.add_argument("--out", default=None,
+                        help="output csv file in headless mode (default: input_dir/exported_items.csv)")
+    parser.add_argument("--append", action="store_true",
+                        help="in headless mode, only add the rows that are not in the output file yet")
+    parser.add_argument("--format", type=int, choices=sorted(EXPORT_FORMATS), default=1, dest="export_fmt",
+                        help="export format in headless mode (default: 1)")
+    
+    args = parser.parse_args()
+    if args.duplicates is None:
+        args.duplicates = "drop" if args.headless else "flag"
+    if args.headless and args.input_dir is None:
+        parser.error("input_dir is required in headless mode")
+    if args.lazy and (args.watch or args.headless or args.history):
+        parser.error("--lazy can not be combined with --watch, --headless or --history")
+    if args.history_range is not None:
+        if args.history is None:
+            parser.error("--history-range needs --history")
+        if args.input_dir is not None or args.watch or args.headless:
+            parser.error("--history-range can not be combined with input_dir, --watch or --headless")
+        try:
+            args.history_range = parseRange(args.history_range, date.fromisoformat)
+        except ValueError:
+            parser.error(f"invalid --history-range: {args.history_range}")
+    if args.rules is not None:
+        # load the rules here, so that errors in the file are reported like the other arguments
+        try:
+            args.rules = RuleEngine.fromFile(args.rules)
+        except (ImportError, OSError, ValueError) as exc:
+            parser.error(f"could not read --rules {args.rules}: {exc}")
+    
+    return args
+
+def runGui(args, cache, rules, history):
+    """Function to open the GUI and import the data from input_dir (or from the history)."""
+    
+    # tkinter is only imported here, so that headless mode works without it (and starts faster)
+    from tkinter.filedialog import askdirectory
+    from window import Window
+    
     # create the GUI object
     window = Window()
     # create the widgets
@@ -17,21 +96,65 @@ if __name__ == "__main__":
     # run mainloop once to update position of window (otherwise filedialog will mess up the geom)
     window.update_idletasks()
     
+    if args.history_range is not None:
+        # load the date range from the history, no csv files needed
+        window.importHistory(history, args.history_range)
+        window.mainloop()
+        return
+    
     # check if using script with file picker or in CLI mode
-    if len(sys.argv) == 1:
+    if args.input_dir is None:
         # get starting directory for open dialog box
         curr_dir = os.getcwd()
         # get files from open dialog
         input_dir = askdirectory(initialdir=curr_dir, title="Select Folder", parent=window)
     else:
         # get dir name from CLI args
-        input_dir = sys.argv[1]
-    
-    # read input data and format appropriately
-    data_lst, format_dict = readInputData(input_dir=input_dir, output_file=window.f_out)
+        input_dir = args.input_dir
     
-    # add data to the GUI
-    window.importData(data_lst, format_dict=format_dict, output_dir=input_dir)
+    if args.lazy:
+        # index the input files, the rows are parsed when used
+        window.importDataLazy(input_dir, rules=rules)
+    else:
+        # read input data in the background and add it to the GUI as it comes in
+        window.importDataAsync(input_dir, workers=args.workers, cache=cache, duplicates=args.duplicates,
+                               rules=rules, watch=args.watch, history=history)
     
     # run the main tkinter loop
     window.mainloop()
+
+if __name__ == "__main__":
+    args = parseArgs()
+    if args.stats or args.stats_file:
+        STATS.enable()
+    if args.stats_file:
+        # written even if the GUI is closed with an error
+        atexit.register(STATS.dump, args.stats_file)
+    cache = None if args.no_cache else ParseCache(cache_dir=args.cache_dir)
+    rules = args.rules
+    history = HistoryStore(args.history) if args.history is not None else None
+    
+    if args.headless:
+        from headless import runHeadless
+        
+        f_out = args.out if args.out is not None else os.path.join(args.input_dir, "exported_items.csv")
+        skipped = []
+        changed = []
+        num_rows, num_duplicates = runHeadless(args.input_dir, f_out=f_out, export_fmt=args.export_fmt, workers=args.workers,
+                               cache=cache, duplicates=args.duplicates, rules=rules, append=args.append,
+                               history=history, skipped=skipped, changed=changed)
+        print(f"{'Appended' if args.append else 'Exported'} {num_rows} rows to {f_out}")
+        if num_duplicates:
+            print(f"{'Dropped' if args.duplicates == 'drop' else 'Found'} {num_duplicates} rows repeated across "
+                  "input files")
+        if changed:
+            print(f"Warning: {len(changed)} rows already in {f_out} have another category now, they were not "
+                  f"appended again: {', '.join(f'{fields[1]} {fields[0]}' for fields in changed[:5])}"
+                  f"{', ...' if len(changed) > 5 else ''}")
+        if skipped:
+            print(f"Skipped {len(skipped)} files with an unsupported csv format: {', '.join(skipped)}")
+        if STATS.enabled:
+            print(STATS.formatReport())
+        sys.exit(0)
+    
+    runGui(args, cache, rules, history)
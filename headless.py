@@ -0,0 +1,54 @@
+"""Headless batch mode: ingest, categorize and export the input data without the GUI (no tkinter)."""
+
+import os
+
+from dedup import DuplicateFilter
+from export import appendExport, writeExport
+from journal import KeyIndex
+from utils import iterInputData, listInputFiles
+
+
+def runHeadless(input_dir, f_out=None, export_fmt=1, workers=1, cache=None, duplicates="drop", desc_len=50,
+                rules=None, append=False, history=None, skipped=None, changed=None):
+    """Function to export all the rows of the csv files in input_dir to f_out, sorted by date.
+    Same result as moving all rows to the output list of the GUI and exporting them.
+    If a RuleEngine is given, it sets the category of the rows before the export.
+    With append, only the rows not in f_out yet are added at its end, and the fields of the rows already in it
+    with another category are added to changed, if given.
+    If a HistoryStore is given, the rows are also saved to it (rows already in it are kept).
+    The names of the files skipped because of an unsupported csv format are added to skipped, if given.
+    Rows repeated across input files are dropped by default, as the output file has no mark for flagged rows.
+    Returns the number of exported (or appended) rows and the number of duplicates found."""
+    
+    if f_out is None:
+        f_out = os.path.join(input_dir, "exported_items.csv")
+    # stream the rows from the input files, without building any listbox strings
+    # the output file of the GUI is never an input statement, even when exporting elsewhere
+    files = listInputFiles(input_dir, exclude=(os.path.basename(f_out),))
+    dup_filter = DuplicateFilter(duplicates)
+    rows = []
+    for idx, batch, file_done in iterInputData(files, desc_len=desc_len, workers=workers, cache=cache):
+        if batch is None:
+            if skipped is not None:
+                skipped.append(os.path.basename(files[idx]))
+            continue
+        batch = dup_filter(batch, file_done)
+        if rules is not None:
+            rules.categorize(batch)
+        rows.extend(batch)
+    if history is not None:
+        # same keys as in the GUI: rows numbered in file order
+        for rid, row in enumerate(rows):
+            row.rid = rid
+        keys = KeyIndex()
+        keys.add(rows)
+        # rows flagged as duplicates are copies of rows of another file
+        kept = [rid for rid, row in enumerate(rows) if not row.dup]
+        history.addRows([keys.keys[rid] for rid in kept], [rows[rid] for rid in kept])
+    # the output list of the GUI is sorted by date (stable, rows keep the file order within a day)
+    rows.sort(key=lambda row: row.date)
+    if append:
+        return appendExport(rows, f_out, export_fmt=export_fmt, changed=changed), dup_filter.num_duplicates
+    writeExport(rows, f_out, export_fmt=export_fmt)
+    
+    return len(rows), dup_filter.num_duplicates
@@ -0,0 +1,105 @@
+"""Local SQLite store of the transaction history: the imported rows of all sessions and their categories."""
+
+import sqlite3
+from datetime import date
+
+from stats import STATS
+from transaction import Transaction
+
+# rows are keyed like the session journal (see KeyIndex), so importing a statement again adds nothing;
+# the primary key starts with the date, so it also serves the date ranges
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    date INTEGER NOT NULL,
+    desc TEXT NOT NULL,
+    cents INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    PRIMARY KEY (date, desc, cents, source, n)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rows_category ON rows (category, date);
+CREATE INDEX IF NOT EXISTS rows_cents ON rows (cents);
+"""
+
+
+class HistoryStore:
+    """Transaction history kept in a SQLite file (no server needed), indexed on date, category and amount.
+    Rows are identified by their stable key (date ordinal, description, amount in cents, source, n),
+    the same as in the session journal, and keep the last category set for them."""
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        # the write-ahead log makes the bulk inserts and the single updates cheaper
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def __len__(self):
+        return self.conn.execute("SELECT count(*) FROM rows").fetchone()[0]
+
+    @STATS.timed("history_add")
+    def addRows(self, keys, rows):
+        """Function to add the rows with their keys, in one transaction. Rows already in the store keep their
+        category. Returns the number of new rows."""
+
+        before = self.conn.total_changes
+        # inserting in key order keeps the writes to the primary key b-tree local (much faster on new rows)
+        entries = sorted((*key, row.category) for key, row in zip(keys, rows))
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO rows VALUES (?, ?, ?, ?, ?, ?)", entries)
+        return self.conn.total_changes - before
+
+    def setCategories(self, keys, categories):
+        """Function to set the category of the rows given by key (rows not in the store are skipped)."""
+
+        with self.conn:
+            self.conn.executemany("UPDATE rows SET category = ? "
+                                  "WHERE date = ? AND desc = ? AND cents = ? AND source = ? AND n = ?",
+                                  ((category, *key) for key, category in zip(keys, categories)))
+
+    def dateSpan(self):
+        """Function to get the first and last date of the history, or (None, None) if it is empty."""
+
+        first, last = self.conn.execute("SELECT min(date), max(date) FROM rows").fetchone()
+        if first is None:
+            return None, None
+        return date.fromordinal(first), date.fromordinal(last)
+
+    @STATS.timed("history_query")
+    def query(self, date_range=(None, None), amount_range=(None, None), categories=()):
+        """Function to get the rows in the (inclusive) date and amount ranges, either end may be None,
+        and with a category matching one of the given names or prefixes (lowercase), sorted by date.
+        Each condition is answered by an index."""
+
+        conditions = []
+        params = []
+        for column, (lo, hi), convert in (("date", date_range, date.toordinal),
+                                          ("cents", amount_range, lambda amount: round(amount * 100))):
+            if lo is not None:
+                conditions.append(f"{column} >= ?")
+                params.append(convert(lo))
+            if hi is not None:
+                conditions.append(f"{column} <= ?")
+                params.append(convert(hi))
+        if categories:
+            # few distinct categories: match them here, then look up the matching ones in the index
+            names = [name for (name,) in self.conn.execute("SELECT DISTINCT category FROM rows")
+                     if name.lower().startswith(tuple(categories))]
+            conditions.append(f"category IN ({', '.join('?' * len(names))})")
+            params.extend(names)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor = self.conn.execute(f"SELECT date, desc, cents, source, category FROM rows {where} "
+                                   "ORDER BY date, source, n", params)
+        # dates repeat a lot, so convert each distinct ordinal only once
+        date_map = {}
+        rows = []
+        for ordinal, desc, cents, source, category in cursor:
+            day = date_map.get(ordinal)
+            if day is None:
+                day = date_map[ordinal] = date.fromordinal(ordinal)
+            rows.append(Transaction(day, desc, category, cents / 100, source))
+        return rows
+
+    def close(self):
+        self.conn.close()
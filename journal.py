@@ -0,0 +1,145 @@
+"""Append-only journal of the moves and category changes of a session, used to restore it on the next launch."""
+
+import json
+import os
+
+# name of the journal file, kept in the output folder
+JOURNAL_FILE = ".session_journal.jsonl"
+
+
+class KeyIndex:
+    """Stable keys of the imported rows, identifying the same row across launches independently of the row ids.
+    The key is (date ordinal, description, amount in cents, source, n), where n counts the identical rows before it."""
+
+    def __init__(self):
+        # key of each row, by rid, and rid of each key
+        self.keys = []
+        self.rids = {}
+        # number of rows seen so far for each (date, description, amount, source)
+        self._counts = {}
+
+    def add(self, rows):
+        """Function to add the keys of rows (with rid already set, in increasing order)."""
+
+        counts = self._counts
+        for row in rows:
+            base = (row.date.toordinal(), row.desc, round(row.amount * 100), row.source)
+            n = counts.get(base, 0)
+            counts[base] = n + 1
+            key = (*base, n)
+            # rows re-imported after others were removed may find their key still taken
+            while key in self.rids:
+                n += 1
+                key = (*base, n)
+            self.keys.append(key)
+            self.rids[key] = row.rid
+
+    def remove(self, rids):
+        """Function to remove the keys of rows that are not imported anymore (e.g. their file was deleted)."""
+
+        counts = self._counts
+        for rid in rids:
+            key = self.keys[rid]
+            if self.rids.get(key) == rid:
+                del self.rids[key]
+                counts[key[:-1]] -= 1
+
+    def toKeys(self, rids):
+        """Function to get the keys of the rows, as lists (json friendly)."""
+
+        return [list(self.keys[rid]) for rid in rids]
+
+    def toRids(self, keys):
+        """Function to get the rids of the keys, skipping the rows that are not imported anymore."""
+
+        rids = []
+        for key in keys:
+            rid = self.rids.get(tuple(key))
+            if rid is not None:
+                rids.append(rid)
+        return rids
+
+
+class SessionJournal:
+    """Journal file with one json record per action:
+        {"op": "move", "dir": "in_to_out" | "out_to_in", "rows": [keys]}
+        {"op": "cat", "rows": [keys], "cats": [new category of each row]}
+    The journal starts with a snapshot record {"op": "snapshot", "out": [keys], "cats": [[key, category]]},
+    and is compacted into a new snapshot every snapshot_every records."""
+
+    def __init__(self, path, snapshot_every=200):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        # number of records appended since the last snapshot
+        self.num_records = 0
+
+    def load(self):
+        """Function to get the records of the journal, starting with its snapshot (empty if there is no journal).
+        A truncated last line (e.g. the app was killed while writing it) is ignored."""
+
+        records = []
+        try:
+            with open(self.path) as fin:
+                for line in fin:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break
+        except OSError:
+            pass
+        self.num_records = len(records)
+        return records
+
+    def append(self, record):
+        """Function to append a record to the journal, flushed right away."""
+
+        with open(self.path, "a") as fout:
+            fout.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.num_records += 1
+
+    def needsCompaction(self):
+        """Function to check if enough records were appended to compact the journal."""
+
+        return self.num_records >= self.snapshot_every
+
+    def compact(self, snapshot):
+        """Function to replace the journal by a single snapshot record, atomically (via a temp file)."""
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as fout:
+            fout.write(json.dumps(snapshot, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, self.path)
+        self.num_records = 0
+
+
+def actionRecord(row_keys, action):
+    """Function to get the journal record of an action of the session, given the KeyIndex of the rows.
+    Actions are ("move", direction, rids) or ("cat", rids, new categories, old categories)."""
+
+    if action[0] == "move":
+        return {"op": "move", "dir": action[1], "rows": row_keys.toKeys(action[2])}
+    return {"op": "cat", "rows": row_keys.toKeys(action[1]), "cats": action[2]}
+
+
+def replayJournal(records):
+    """Function to fold the records of a journal into the final state of the session:
+    the keys of the rows in the output list, and the categories set by the user (both keyed by tuple)."""
+
+    out = {}
+    cats = {}
+    for record in records:
+        op = record.get("op")
+        if op == "snapshot":
+            out = dict.fromkeys(tuple(key) for key in record["out"])
+            cats = {tuple(key): cat for key, cat in record["cats"]}
+        elif op == "move":
+            keys = [tuple(key) for key in record["rows"]]
+            if record["dir"] == "in_to_out":
+                out.update(dict.fromkeys(keys))
+            else:
+                for key in keys:
+                    out.pop(key, None)
+        elif op == "cat":
+            for key, cat in zip(record["rows"], record["cats"]):
+                cats[tuple(key)] = cat
+    return list(out), cats
@@ -0,0 +1,200 @@
+"""Memory-mapped lazy reader for very large statement csv files: the rows are only parsed when used."""
+
+import bisect
+import csv
+import mmap
+import os
+from array import array
+
+from schemas import compileSchema
+from stats import STATS
+
+# numpy is an optional dependency, used to find the line breaks faster
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# lines skipped at import (see iterFileRows) contain this word, they are checked once parsed
+SKIP_WORD = b"auto"
+# bytes scanned at a time when looking for the line breaks or skipped lines (bounds the temporary copies)
+INDEX_CHUNK = 64 * 1024**2
+# rows parsed at a time when many rows are needed at once
+PARSE_CHUNK = 20000
+
+
+def findAll(data, needle, start=0):
+    """Generator of the positions of needle in data (from start), each found by a search in C."""
+
+    pos = data.find(needle, start)
+    while pos >= 0:
+        yield pos
+        pos = data.find(needle, pos + 1)
+
+
+def isSkippedRow(fields):
+    """Function to check if a csv row is skipped at import: autopay lines and empty lines."""
+
+    row_str = " ".join(fields).lower()
+    return ("autopay" in row_str) or ("automatic payment" in row_str) or (len(fields) == 0)
+
+
+class MappedCSV:
+    """Statement csv file mapped in memory, with the start offsets of its data rows found in one pass.
+    A row is decoded and mapped to a Transaction (by the compiled schema of the file) only when asked for,
+    so opening a file costs one scan of its bytes and 8 bytes per row.
+    Assumes one row per line (no line breaks inside quoted fields), as in the bank exports."""
+
+    def __init__(self, path, desc_len=50):
+        self.path = path
+        with open(path, "rb") as fin:
+            size = os.fstat(fin.fileno()).st_size
+            # an empty file can not be mapped
+            self.data = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        end = self.data.find(b"\n")
+        end = len(self.data) if end < 0 else end
+        header = ",".join(next(csv.reader([self.data[:end].decode().rstrip("\r")]), []))
+        self.map_row = compileSchema(header, desc_len)
+        self.starts = self._index(end + 1)
+
+    def _line_starts(self, start):
+        """Function to get the start offset of every line after the header (including the empty ones)."""
+
+        data = self.data
+        starts = array("Q")
+        if start >= len(data):
+            return starts
+        starts.append(start)
+        if np is not None:
+            for offset in range(start, len(data), INDEX_CHUNK):
+                chunk = np.frombuffer(data, dtype=np.uint8, count=min(INDEX_CHUNK, len(data) - offset), offset=offset)
+                starts.frombytes((np.flatnonzero(chunk == 10) + (offset + 1)).astype(np.uint64).tobytes())
+        else:
+            pos = data.find(b"\n", start)
+            while pos >= 0:
+                starts.append(pos + 1)
+                pos = data.find(b"\n", pos + 1)
+        # no line starts after the final line break
+        if starts[-1] >= len(data):
+            starts.pop()
+        return starts
+
+    def _index(self, start):
+        """Function to get the start offsets of the data rows: all lines except the empty ones and the
+        autopay lines (only the few lines matching SKIP_PATTERN are parsed to check them)."""
+
+        data = self.data
+        starts = self._line_starts(start)
+        # empty lines start right after a line break and end with the next one
+        skipped = {pos + 1 for needle in (b"\n\n", b"\n\r\n") for pos in findAll(data, needle, start - 1)}
+        # candidates for the autopay lines, searched in a lowercase copy of each chunk
+        overlap = len(SKIP_WORD) - 1
+        for offset in range(start, len(data), INDEX_CHUNK):
+            chunk = data[offset:offset + INDEX_CHUNK + overlap].lower()
+            for pos in findAll(chunk, SKIP_WORD):
+                line_start = data.rfind(b"\n", 0, offset + pos) + 1
+                if line_start not in skipped and isSkippedRow(self._fields(line_start)):
+                    skipped.add(line_start)
+        if not skipped:
+            return starts
+        # copy the offsets between the skipped lines (found by bisect, the offsets are sorted)
+        kept = array("Q")
+        pos = 0
+        for line_start in sorted(skipped):
+            idx = bisect.bisect_left(starts, line_start)
+            if idx < len(starts) and starts[idx] == line_start:
+                kept.extend(starts[pos:idx])
+                pos = idx + 1
+        kept.extend(starts[pos:])
+        return kept
+
+    def _line(self, start):
+        end = self.data.find(b"\n", start)
+        return self.data[start:end if end >= 0 else len(self.data)].decode().rstrip("\r")
+
+    def _fields(self, start):
+        return next(csv.reader([self._line(start)]), [])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def row(self, index):
+        """Function to parse the index-th data row into a Transaction."""
+
+        return self.map_row(self._fields(self.starts[index]))
+
+    def rows(self, indices):
+        """Function to parse the data rows at indices into Transactions, in one pass of the csv reader."""
+
+        starts = self.starts
+        return list(map(self.map_row, csv.reader([self._line(starts[i]) for i in indices])))
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+
+class LazyRows:
+    """Table of the rows of several MappedCSV files, indexed by rid like the list of rows of the Window.
+    A row is parsed (and categorized by the rules, if any) on first access and then kept, so that
+    changes to it (e.g. its category) stick. Iterating over the table parses all the rows."""
+
+    def __init__(self, files, rules=None):
+        self.files = files
+        self.rules = rules
+        # first rid of each file, and the parsed rows by rid
+        self.offsets = [0]
+        for mapped in files:
+            self.offsets.append(self.offsets[-1] + len(mapped))
+        self.parsed = {}
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def file_ranges(self):
+        """Function to get the range of rids of each file, in file order."""
+
+        return [range(start, end) for start, end in zip(self.offsets, self.offsets[1:])]
+
+    def __getitem__(self, rid):
+        row = self.parsed.get(rid)
+        if row is None:
+            row = self.load([rid])[0]
+        return row
+
+    @STATS.timed("lazy_parse")
+    def load(self, rids):
+        """Function to get the rows given by rid, parsing the ones not parsed yet (in file order)."""
+
+        parsed = self.parsed
+        missing = sorted(rid for rid in set(rids) if rid not in parsed)
+        if missing:
+            if missing[-1] >= len(self) or missing[0] < 0:
+                raise IndexError("LazyRows index out of range")
+            file_idx = 0
+            for start in range(0, len(missing), PARSE_CHUNK):
+                chunk = missing[start:start + PARSE_CHUNK]
+                rows = []
+                # the chunk may span several files
+                pos = 0
+                while pos < len(chunk):
+                    while chunk[pos] >= self.offsets[file_idx + 1]:
+                        file_idx += 1
+                    offset = self.offsets[file_idx]
+                    end = bisect.bisect_left(chunk, self.offsets[file_idx + 1], pos)
+                    rows.extend(self.files[file_idx].rows([rid - offset for rid in chunk[pos:end]]))
+                    pos = end
+                for rid, row in zip(chunk, rows):
+                    row.rid = rid
+                    parsed[rid] = row
+                if self.rules is not None:
+                    self.rules.categorize(rows)
+        return [parsed[rid] for rid in rids]
+
+    def __iter__(self):
+        for start in range(0, len(self), PARSE_CHUNK):
+            yield from self.load(range(start, min(start + PARSE_CHUNK, len(self))))
+
+    def close(self):
+        for mapped in self.files:
+            mapped.close()
@@ -0,0 +1,291 @@
+"""Define a virtualized listbox widget using TKinter."""
+
+import sys
+
+# import tkinter depends on py version
+if sys.version_info.major > 2:
+    import tkinter as tk
+else:
+    import Tkinter as tk
+
+from stats import STATS
+
+
+class RedrawScheduler:
+    """Coalesces the redraws requested while handling an event: each callback requested during an
+    event-loop turn runs once, from a single after_idle call, so a burst of N changes costs one redraw."""
+
+    def __init__(self, widget):
+        # widget providing after_idle (the main window)
+        self.widget = widget
+        # callbacks to run on the next idle turn, in request order (dict used as an ordered set)
+        self.pending = {}
+        self.job = None
+
+    def request(self, callback):
+        """Function to run callback on the next idle turn (once, however often it is requested)."""
+
+        self.pending[callback] = None
+        if self.job is None:
+            self.job = self.widget.after_idle(self.flush)
+
+    @STATS.timed("redraw")
+    def flush(self):
+        """Function to run the pending callbacks now."""
+
+        self.job = None
+        pending, self.pending = self.pending, {}
+        for callback in pending:
+            callback()
+
+
+class VirtualListbox:
+    """Listbox that only materializes the rows currently scrolled into view.
+    The rows live in a Python list and are rendered to strings by render_item when displayed.
+    Supports extended selection (click, shift-click, ctrl-click, drag and keys), horizontal
+    scrolling and font resizing, with the selection kept as a set of row indices.
+    Changes to the rows or the selection are redrawn through the scheduler (a RedrawScheduler),
+    or right away if there is none."""
+
+    def __init__(self, frame, font, render_item, scheduler=None):
+        self.font = font
+        self.render_item = render_item
+        self.scheduler = scheduler
+        # range of changed row indices (first, last) not redrawn yet, and the number of rows at the last redraw
+        self.dirty = None
+        self.drawn_len = 0
+        # data rows, index of the first row in view and number of rows that fit in the view
+        self.items = []
+        self.top = 0
+        self.num_visible = 1
+        # selected row indices, anchor for range selection and active row for keyboard navigation
+        self.selected = set()
+        self.anchor = None
+        self.active = None
+
+        # define listbox and scrollbars h/v (vertical scrollbar is driven by the full list of items)
+        self.listbox = tk.Listbox(frame, selectmode=tk.EXTENDED, font=font, exportselection=False,
+                                  activestyle="none")
+        self.scrollbarH = tk.Scrollbar(self.listbox, orient="horizontal")
+        self.scrollbarV = tk.Scrollbar(self.listbox, orient="vertical")
+
+        # configure scrollbars and listbox so they know about each other
+        self.scrollbarH.config(command=self.listbox.xview)
+        self.scrollbarV.config(command=self.yview)
+        self.listbox.config(xscrollcommand=self.scrollbarH.set)
+
+        # place the elements
+        self.scrollbarH.pack(side="bottom", fill="x")
+        self.scrollbarV.pack(side="right", fill="y")
+        # place listbox to cover the whole frame
+        self.listbox.place(relx=0, rely=0, relwidth=1, relheight=1)
+
+        # replace the default listbox bindings, since the listbox only holds the rows in view
+        bindings = {
+            "<Button-1>": self._on_click,
+            "<Shift-Button-1>": lambda e: self._on_click(e, extend=True),
+            "<Control-Button-1>": lambda e: self._on_click(e, toggle=True),
+            "<B1-Motion>": self._on_drag,
+            "<MouseWheel>": lambda e: self._scroll_units(-1 if e.delta > 0 else 1, 3),
+            "<Button-4>": lambda e: self._scroll_units(-1, 3),
+            "<Button-5>": lambda e: self._scroll_units(1, 3),
+            "<Up>": lambda e: self._on_key(-1),
+            "<Down>": lambda e: self._on_key(1),
+            "<Shift-Up>": lambda e: self._on_key(-1, extend=True),
+            "<Shift-Down>": lambda e: self._on_key(1, extend=True),
+            "<Prior>": lambda e: self._scroll_units(-1, self.num_visible),
+            "<Next>": lambda e: self._scroll_units(1, self.num_visible),
+            "<Home>": lambda e: self._scroll_to(0),
+            "<End>": lambda e: self._scroll_to(len(self.items)),
+            "<Control-a>": self._select_all,
+            "<Configure>": lambda e: self.refresh(),
+        }
+        for event, callback in bindings.items():
+            self.listbox.bind(event, lambda e, callback=callback: self._break(callback, e))
+
+    @staticmethod
+    def _break(callback, event):
+        """Function to run an event callback and stop the default listbox bindings."""
+
+        callback(event)
+        return "break"
+
+    def set_items(self, items):
+        """Function to set the list of rows shown by the listbox."""
+
+        self.items = items
+        self.selected.clear()
+        self.anchor = None
+        self.active = None
+        self.invalidate()
+
+    def invalidate(self, first=0, last=None):
+        """Function to mark the rows between first and last (inclusive, all rows by default) as changed.
+        They are redrawn once on the next idle turn, together with the other changes of the same turn."""
+
+        last = sys.maxsize if last is None else last
+        if self.dirty is not None:
+            first = min(first, self.dirty[0])
+            last = max(last, self.dirty[1])
+        self.dirty = (first, last)
+        if self.scheduler is None:
+            self.flush()
+        else:
+            self.scheduler.request(self.flush)
+
+    def flush(self):
+        """Function to redraw the changed rows, if any of them is in view (or the number of rows changed)."""
+
+        if self.dirty is None:
+            return
+        first, last = self.dirty
+        self.dirty = None
+        if len(self.items) == self.drawn_len and (last < self.top or first >= self.top + self.num_visible):
+            return
+        self.refresh()
+
+    def size(self):
+        return len(self.items)
+
+    def curselection(self):
+        """Function to get the sorted indices of the selected rows (same as tk.Listbox)."""
+
+        return tuple(sorted(i for i in self.selected if i < len(self.items)))
+
+    def select_clear(self, first=0, last=tk.END):
+        """Function to clear the selection between first and last (inclusive)."""
+
+        if first == 0 and last == tk.END:
+            self.selected.clear()
+            self.invalidate()
+        else:
+            last = len(self.items) - 1 if last == tk.END else last
+            self.selected.difference_update(range(first, last + 1))
+            self.invalidate(first, last)
+
+    selection_clear = select_clear
+
+    def select_set(self, first, last=None):
+        """Function to select the rows between first and last (inclusive)."""
+
+        last = first if last is None else last
+        last = len(self.items) - 1 if last == tk.END else last
+        self.selected.update(range(first, last + 1))
+        self.invalidate(first, last)
+
+    selection_set = select_set
+
+    def select_indices(self, indices):
+        """Function to replace the selection by the rows at indices, scrolling to the first one."""
+
+        self.selected = set(indices)
+        self.anchor = self.active = min(self.selected) if self.selected else None
+        if self.anchor is not None:
+            self.see(self.anchor)
+        self.invalidate()
+
+    @STATS.timed("listbox_refresh")
+    def refresh(self):
+        """Function to (re)draw the rows currently scrolled into view.
+        Cost depends only on the size of the view, not on the number of rows."""
+
+        # number of rows that fit in the listbox, leaving room for the horizontal scrollbar
+        height = self.listbox.winfo_height() - self.scrollbarH.winfo_height()
+        self.num_visible = max(height // max(self.font.metrics("linespace"), 1), 1)
+        # keep the view inside the list
+        self.top = max(min(self.top, len(self.items) - self.num_visible), 0)
+        bottom = min(self.top + self.num_visible, len(self.items))
+        # replace the rows in the listbox with the ones in view, keeping the horizontal position
+        xview = self.listbox.xview()[0]
+        self.listbox.delete(0, tk.END)
+        rows = [self.render_item(self.items[i]) for i in range(self.top, bottom)]
+        if rows:
+            self.listbox.insert(tk.END, *rows)
+        for i in range(self.top, bottom):
+            if i in self.selected:
+                self.listbox.selection_set(i - self.top)
+        self.listbox.xview_moveto(xview)
+        # update the vertical scrollbar with the position of the view in the full list
+        num_items = max(len(self.items), 1)
+        self.scrollbarV.set(self.top / num_items, bottom / num_items)
+        self.drawn_len = len(self.items)
+
+    def yview(self, *args):
+        """Function called by the vertical scrollbar to move the view."""
+
+        if args[0] == "moveto":
+            self._scroll_to(int(float(args[1]) * len(self.items)))
+        elif args[0] == "scroll":
+            step = self.num_visible if args[2] == "pages" else 1
+            self._scroll_units(int(args[1]), step)
+
+    def see(self, index):
+        """Function to scroll the view so that the row at index is visible."""
+
+        if index < self.top:
+            self._scroll_to(index)
+        elif index >= self.top + self.num_visible:
+            self._scroll_to(index - self.num_visible + 1)
+
+    def _scroll_to(self, top):
+        self.top = top
+        self.refresh()
+
+    def _scroll_units(self, direction, step):
+        self._scroll_to(self.top + direction * step)
+
+    def nearest(self, y):
+        """Function to get the index of the row at vertical position y in the listbox."""
+
+        if not self.items:
+            return None
+        return min(self.top + self.listbox.nearest(y), len(self.items) - 1)
+
+    def _on_click(self, event, extend=False, toggle=False):
+        self.listbox.focus_set()
+        index = self.nearest(event.y)
+        if index is None:
+            return
+        if extend and self.anchor is not None:
+            # select the range between the anchor and the clicked row
+            self.selected.clear()
+            self.selected.update(range(min(self.anchor, index), max(self.anchor, index) + 1))
+        elif toggle:
+            self.selected.symmetric_difference_update([index])
+            self.anchor = index
+        else:
+            self.selected = {index}
+            self.anchor = index
+        self.active = index
+        self.refresh()
+
+    def _on_drag(self, event):
+        # scroll when dragging above or below the listbox
+        if event.y < 0:
+            self._scroll_units(-1, 1)
+        elif event.y > self.listbox.winfo_height():
+            self._scroll_units(1, 1)
+        index = self.nearest(min(max(event.y, 0), self.listbox.winfo_height()))
+        if index is None or self.anchor is None:
+            return
+        self.selected = set(range(min(self.anchor, index), max(self.anchor, index) + 1))
+        self.active = index
+        self.refresh()
+
+    def _on_key(self, direction, extend=False):
+        if not self.items:
+            return
+        current = self.active if self.active is not None else self.top
+        index = min(max(current + direction, 0), len(self.items) - 1)
+        if extend and self.anchor is not None:
+            self.selected = set(range(min(self.anchor, index), max(self.anchor, index) + 1))
+        else:
+            self.selected = {index}
+            self.anchor = index
+        self.active = index
+        self.see(index)
+        self.refresh()
+
+    def _select_all(self, event=None):
+        self.selected = set(range(len(self.items)))
+        self.refresh()
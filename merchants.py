@@ -0,0 +1,81 @@
+"""Normalization of the transaction descriptions into merchant keys, and index of the rows of each merchant."""
+
+import re
+from array import array
+from functools import lru_cache
+
+from stats import STATS
+
+# distinct descriptions remembered by merchantKey (the same merchants repeat thousands of times)
+MERCHANT_CACHE_SIZE = 65536
+# card processor prefixes written before the merchant name, e.g. "SQ *BLUE BOTTLE"
+PROCESSOR_PREFIXES = ("SQ", "TST", "PP", "SP", "PAYPAL", "GOOGLE", "APL")
+# characters dropped from the merchant names
+PUNCTUATION = re.compile(r"[^\w&'./ -]+")
+
+
+@lru_cache(maxsize=MERCHANT_CACHE_SIZE)
+def merchantKey(desc):
+    """Function to get the canonical merchant of a description: uppercase, without the processor prefix,
+    the reference code after "*" and everything from the first store number (a word with a digit),
+    e.g. "AMAZON MKTP US*2K4, LLC" -> "AMAZON MKTP US" and "STARBUCKS #1234 SEATTLE" -> "STARBUCKS".
+    The first word is always kept, so "7-ELEVEN" stays itself."""
+
+    text = desc.upper()
+    name, star, rest = text.partition("*")
+    if star:
+        # "SQ *MERCHANT": the merchant comes after the star, otherwise the star starts a reference code
+        text = rest if name.strip() in PROCESSOR_PREFIXES else name
+    words = PUNCTUATION.sub(" ", text).split()
+    kept = words[:1]
+    for word in words[1:]:
+        if any(char.isdigit() for char in word):
+            break
+        kept.append(word)
+    # trailing separators left by the punctuation, e.g. "CVS/PHARMACY -"
+    return " ".join(kept).strip(" -./") or text.strip()
+
+
+STATS.watchCache("merchantKey", merchantKey)
+
+
+class MerchantIndex:
+    """Index of the rows (by rid) of each merchant, filled at ingest: the merchant key of each row
+    and the rids of the rows of each merchant, so all the rows of a merchant are found in one lookup."""
+
+    def __init__(self):
+        # merchant keys, their ids and the rids of the rows of each merchant
+        self.merchant_ids = {}
+        self.merchants = []
+        self.postings = []
+        # merchant id of each row, by rid
+        self.row_merchant = array("I")
+
+    def add(self, rows):
+        """Function to add rows (with rid already set, in increasing order) to the index."""
+
+        for row in rows:
+            merchant = merchantKey(row.desc)
+            merchant_id = self.merchant_ids.get(merchant)
+            if merchant_id is None:
+                merchant_id = self.merchant_ids[merchant] = len(self.merchants)
+                self.merchants.append(merchant)
+                self.postings.append(array("I"))
+            self.postings[merchant_id].append(row.rid)
+            self.row_merchant.append(merchant_id)
+
+    def __len__(self):
+        return len(self.row_merchant)
+
+    def merchantOf(self, rid):
+        """Function to get the merchant key of a row."""
+
+        return self.merchants[self.row_merchant[rid]]
+
+    def rowsOf(self, rids):
+        """Function to get the sorted rids of all the rows sharing a merchant with one of the given rows."""
+
+        merchant_ids = {self.row_merchant[rid] for rid in rids}
+        if len(merchant_ids) == 1:
+            return list(self.postings[merchant_ids.pop()])
+        return sorted(rid for merchant_id in merchant_ids for rid in self.postings[merchant_id])
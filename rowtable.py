@@ -0,0 +1,213 @@
+"""Views over the table of imported rows, as shown by the listboxes."""
+
+from array import array
+from itertools import compress
+
+from transaction import dateKey
+
+
+class RowView:
+    """Read-only sequence of the visible slots of a fixed order of rows and decoration lines (header,
+    separators), indexed like a list by the VirtualListbox. The slots hold the rids of the rows or the
+    decoration strings, and a bitmap tells which slots are visible: moving a row between views only
+    flips its bits. A Fenwick tree over the bitmap maps a view index to its slot in O(log n).
+    An empty padding line is always shown after the last slot (fixes the last line hidden by the scrollbar)."""
+
+    def __init__(self, rows, padding=""):
+        self.rows = rows
+        self.padding = padding
+        self.reset([], [])
+
+    def reset(self, slots, visible):
+        """Function to replace the order of the view, given the slots and their visibility (0/1)."""
+
+        self.slots = list(slots)
+        self.visible = bytearray(visible)
+        # slot of each rid (-1 for the rows not in this view)
+        slot_of = self.slot_of = array("q", [-1]) * len(self.rows)
+        for slot, item in enumerate(self.slots):
+            if type(item) is int:
+                slot_of[item] = slot
+        self._build_tree()
+
+    def _build_tree(self):
+        """Function to build the Fenwick tree (1-based) of the bitmap in one pass:
+        node i holds the number of visible slots in (i - lowbit(i), i]."""
+
+        tree = [0] + list(self.visible)
+        size = len(self.slots)
+        for i in range(1, size + 1):
+            j = i + (i & -i)
+            if j <= size:
+                tree[j] += tree[i]
+        self.tree = tree
+        self.total = sum(self.visible)
+
+    def _grow(self, rid):
+        if rid >= len(self.slot_of):
+            self.slot_of.extend([-1] * (rid + 1 - len(self.slot_of)))
+
+    def append(self, item, visible=1):
+        """Function to add a slot (rid or decoration string) at the end of the view."""
+
+        slot = len(self.slots)
+        self.slots.append(item)
+        self.visible.append(visible)
+        if type(item) is int:
+            self._grow(item)
+            self.slot_of[item] = slot
+        # the new node covers (i - lowbit(i), i]: sum the nodes of the slots before it in that range
+        tree = self.tree
+        i = slot + 1
+        value = visible
+        j = i - 1
+        stop = i - (i & -i)
+        while j > stop:
+            value += tree[j]
+            j -= j & -j
+        tree.append(value)
+        self.total += visible
+
+    def __len__(self):
+        return self.total + 1
+
+    def _find(self, index):
+        """Function to get the slot of the index-th visible slot."""
+
+        tree = self.tree
+        pos = 0
+        remaining = index + 1
+        step = 1 << (len(self.slots).bit_length() - 1) if self.slots else 0
+        while step:
+            nxt = pos + step
+            if nxt < len(tree) and tree[nxt] < remaining:
+                pos = nxt
+                remaining -= tree[nxt]
+            step >>= 1
+        return pos
+
+    def _item(self, slot):
+        item = self.slots[slot]
+        return self.rows[item] if type(item) is int else item
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index == self.total:
+            return self.padding
+        if not 0 <= index < self.total:
+            raise IndexError("RowView index out of range")
+        return self._item(self._find(index))
+
+    def visible_slots(self):
+        """Function to get all the visible slots, in view order (one pass in C)."""
+
+        return list(compress(self.slots, self.visible))
+
+    def visible_rids(self):
+        """Function to get the rids of the visible rows, in view order."""
+
+        return [item for item in compress(self.slots, self.visible) if type(item) is int]
+
+    def rows_at(self, indices):
+        """Function to get the rows at the given view indices, skipping the decoration lines."""
+
+        if len(indices) * 32 > self.total:
+            # many indices: cheaper to list the visible slots once
+            slots = self.visible_slots()
+            items = [slots[i] for i in indices if i < len(slots)]
+        else:
+            items = [self.slots[self._find(i)] for i in indices if i < self.total]
+        rids = [item for item in items if type(item) is int]
+        # a lazy table (LazyRows) parses the rows in one batch
+        load = getattr(self.rows, "load", None)
+        if load is not None:
+            return load(rids)
+        rows = self.rows
+        return [rows[rid] for rid in rids]
+
+    def _count_before(self, slot):
+        """Function to get the number of visible slots before slot (its index in the view, if visible)."""
+
+        tree = self.tree
+        count = 0
+        i = slot
+        while i > 0:
+            count += tree[i]
+            i -= i & -i
+        return count
+
+    def indices_of(self, rids):
+        """Function to get the view indices of the visible rows given by rid (e.g. to select them)."""
+
+        if len(rids) * 32 > self.total:
+            # many rows: cheaper to number the visible slots once
+            wanted = set(rids)
+            return [i for i, item in enumerate(self.visible_slots()) if type(item) is int and item in wanted]
+        slot_of = self.slot_of
+        visible = self.visible
+        slots = [slot_of[rid] for rid in rids if rid < len(slot_of)]
+        return sorted(self._count_before(slot) for slot in slots if slot >= 0 and visible[slot])
+
+    def set_visible(self, rids, visible):
+        """Function to show (visible=1) or hide (visible=0) the rows given by rid, only flipping their bits."""
+
+        slots = [self.slot_of[rid] for rid in rids if rid < len(self.slot_of)]
+        slots = [slot for slot in slots if slot >= 0 and self.visible[slot] != visible]
+        if not slots:
+            return
+        delta = 1 if visible else -1
+        for slot in slots:
+            self.visible[slot] = visible
+        self.total += delta * len(slots)
+        if len(slots) * 32 > len(self.slots):
+            # many changes: rebuilding the tree in one pass is cheaper than updating it per slot
+            self._build_tree()
+            return
+        tree = self.tree
+        size = len(self.slots)
+        for slot in slots:
+            i = slot + 1
+            while i <= size:
+                tree[i] += delta
+                i += i & -i
+
+
+def moveRows(rids, direction, rows, in_output, list_in, list_out=None, totals=None):
+    """Function to move the rows given by rid between the input and output views ("in_to_out" or "out_to_in"),
+    flipping their membership in in_output (0: input, 1: output) and their visibility in both views,
+    and updating the totals of the output list. list_out may be None if the output view is rebuilt instead.
+    Rows already on that side (or retracted) are skipped. Returns the rids of the moved rows."""
+
+    to_output = 1 if direction == "in_to_out" else 0
+    rids = [rid for rid in rids if in_output[rid] == 1 - to_output]
+    if not rids:
+        return rids
+    for rid in rids:
+        in_output[rid] = to_output
+    list_in.set_visible(rids, 1 - to_output)
+    if list_out is not None:
+        list_out.set_visible(rids, to_output)
+    if totals is not None:
+        totals.add([rows[rid] for rid in rids], sign=1 if to_output else -1)
+    return rids
+
+
+def setCategories(rids, categories, rows, in_output, totals=None):
+    """Function to set the category of each row given by rid, updating the totals of the output list
+    with the rows of the output list that change category. Returns True if the totals changed."""
+
+    changed = [(rows[rid], category) for rid, category in zip(rids, categories) if in_output[rid] == 1]
+    if changed and totals is not None:
+        totals.setCategories(*zip(*changed))
+    for rid, category in zip(rids, categories):
+        rows[rid].category = category
+    return bool(changed)
+
+
+def dateOrder(rows, in_output):
+    """Function to get the slots and visibility of the output view: all the rows sorted by date
+    (stable, rows of the same date keep the import order), visible if in the output list."""
+
+    order = [row.rid for row in sorted(rows, key=dateKey)]
+    return order, [in_output[rid] == 1 for rid in order]
@@ -0,0 +1,142 @@
+"""Rule engine to set the category of the rows automatically at ingest."""
+
+import json
+import re
+
+from stats import STATS
+from transaction import CATEGORIES
+
+# tomllib is only part of the standard library from python 3.11
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+
+class Rule:
+    """Categorization rule: rows whose description contains any of the keywords (case insensitive),
+    with amount in [min_amount, max_amount] and coming from the given source (csv format name)
+    get the category. Conditions that are not given always match."""
+
+    __slots__ = ("category", "contains", "min_amount", "max_amount", "source")
+
+    def __init__(self, category, contains=(), min_amount=None, max_amount=None, source=None):
+        if isinstance(contains, str):
+            contains = [contains]
+        self.category = category
+        self.contains = [keyword.lower() for keyword in contains if keyword]
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+        self.source = source
+
+    def matches(self, row):
+        """Function to check the amount and source conditions of the rule for a row."""
+
+        return ((self.min_amount is None or row.amount >= self.min_amount)
+                and (self.max_amount is None or row.amount <= self.max_amount)
+                and (self.source is None or row.source == self.source))
+
+
+def trieRegex(words):
+    """Function to build a regex matching any of the words, structured as a trie so that the regex
+    engine follows a single branch per position. At each position it matches the longest word."""
+
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        # empty key marks the end of a word
+        node[""] = {}
+
+    def build(node):
+        alternatives = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not alternatives:
+            return ""
+        body = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+        # the word can end here, or continue (greedy, so the longest word is preferred)
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class RuleEngine:
+    """All the rules compiled into a single matcher. The first rule (in file order) that matches a row wins.
+    The keywords of all rules are combined into one trie regex, run once per distinct description,
+    so the cost per row does not grow with the number of rules."""
+
+    def __init__(self, rules, categories=CATEGORIES):
+        for rule in rules:
+            if rule.category not in categories:
+                raise ValueError(f"Unknown category in rule: {rule.category} (expected one of {categories})")
+        self.rules = rules
+        # rules without keywords are candidates for all rows
+        self.any_desc = [i for i, rule in enumerate(rules) if not rule.contains]
+        # rules of each keyword
+        keyword_rules = {}
+        for i, rule in enumerate(rules):
+            for keyword in rule.contains:
+                keyword_rules.setdefault(keyword, set()).add(i)
+        # at a given position the regex only reports the longest keyword, the other keywords matching
+        # there are its prefixes: add their rules to the rules of the longest keyword
+        self.keyword_rules = {}
+        for keyword in keyword_rules:
+            rule_ids = set()
+            for end in range(1, len(keyword) + 1):
+                rule_ids |= keyword_rules.get(keyword[:end], set())
+            self.keyword_rules[keyword] = rule_ids
+        # zero-width lookahead, so that matches can overlap
+        self.regex = re.compile(f"(?=({trieRegex(keyword_rules)}))") if keyword_rules else None
+        # candidate rules for each distinct description, in priority order
+        self._candidates = {}
+
+    @classmethod
+    def fromFile(cls, path, categories=CATEGORIES):
+        """Function to load the rules from a toml ([[rule]] tables) or json ({"rules": [...]}) file.
+        Raises a ValueError for a file that can not be parsed or holds invalid rules."""
+
+        if path.lower().endswith(".json"):
+            with open(path) as fin:
+                data = json.load(fin)
+        else:
+            if tomllib is None:
+                raise ImportError("reading toml rules needs python >= 3.11 or the tomli package, use a json file instead")
+            with open(path, "rb") as fin:
+                data = tomllib.load(fin)
+        try:
+            rules = [Rule(**item) for item in data.get("rule", data.get("rules", []))]
+        except (AttributeError, TypeError) as exc:
+            # not a table of rules, or unknown rule fields
+            raise ValueError(f"invalid rules in {path}: {exc}") from exc
+
+        return cls(rules, categories=categories)
+
+    def candidates(self, desc):
+        """Function to get the ids of the rules whose keywords match the description, plus the rules without keywords."""
+
+        rule_ids = self._candidates.get(desc)
+        if rule_ids is None:
+            matched = set(self.any_desc)
+            if self.regex is not None:
+                for match in self.regex.finditer(desc.lower()):
+                    if match.group(1):
+                        matched |= self.keyword_rules[match.group(1)]
+            rule_ids = self._candidates[desc] = sorted(matched)
+        return rule_ids
+
+    @STATS.timed("rules")
+    def categorize(self, rows):
+        """Function to set the category of the rows (in place) using the first matching rule.
+        Rows without a matching rule keep their category."""
+
+        rules = self.rules
+        for row in rows:
+            for rule_id in self.candidates(row.desc):
+                rule = rules[rule_id]
+                if rule.matches(row):
+                    row.category = rule.category
+                    break
+        return rows
@@ -0,0 +1,125 @@
+"""Registry of the supported input csv formats and functions to compile them into row mappers."""
+
+from datetime import date, datetime
+from functools import lru_cache
+
+from stats import STATS
+from transaction import DEFAULT_CATEGORY, Transaction
+
+# registry of known csv formats, keyed by the (comma-joined) header of the file
+SCHEMAS = {}
+
+
+class UnsupportedFormatError(ValueError):
+    """Raised for a csv file whose header matches none of the registered formats."""
+
+
+class Schema:
+    """Description of a csv format: which columns hold the date, description and amount."""
+
+    __slots__ = ("name", "header", "date_col", "date_fmt", "desc_col", "amount_col", "sign", "credit_col",
+                 "account_col")
+
+    def __init__(self, name, header, date_col, desc_col, amount_col, date_fmt="%m/%d/%Y", sign=1, credit_col=None,
+                 account_col=None):
+        self.name = name
+        self.header = header
+        self.date_col = date_col
+        self.date_fmt = date_fmt
+        self.desc_col = desc_col
+        # amount: multiplied by sign to ensure consistent signs, debit -, credit +
+        self.amount_col = amount_col
+        self.sign = sign
+        # optional column used (as is) when the amount column is empty, e.g. separate debit/credit columns
+        self.credit_col = credit_col
+        # optional column identifying the account of each row, e.g. the card number
+        self.account_col = account_col
+
+
+def registerSchema(name, header, date_col, desc_col, amount_col, date_fmt="%m/%d/%Y", sign=1, credit_col=None,
+                   account_col=None):
+    """Function to register a new csv format, identified by the header line of the file."""
+
+    SCHEMAS[header] = Schema(name, header, date_col, desc_col, amount_col, date_fmt=date_fmt, sign=sign,
+                             credit_col=credit_col, account_col=account_col)
+    # previously compiled mappers may be out of date
+    compileSchema.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def compileSchema(header, desc_len=50):
+    """Function to compile the csv format with the given header into a function that
+    maps a csv row to a Transaction. Compiled once per file instead of checking the header per row.
+    The account of the rows is taken from the account column of the format, if any, else it is left empty."""
+
+    schema = SCHEMAS.get(header)
+    if schema is None:
+        raise UnsupportedFormatError(f"Unsupported csv header: {header}")
+    # bind everything needed by the mapper to local variables
+    parse_date = dateParser(schema.date_fmt)
+    date_col = schema.date_col
+    desc_col = schema.desc_col
+    amount_col = schema.amount_col
+    sign = schema.sign
+    credit_col = schema.credit_col
+    account_col = schema.account_col
+    source = schema.name
+
+    def mapRow(row):
+        amount = row[amount_col]
+        if credit_col is not None and amount == "":
+            amount = float(row[credit_col])
+        else:
+            amount = sign * float(amount)
+        # set max length for description and default category for all rows
+        return Transaction(parse_date(row[date_col]), row[desc_col][:desc_len].strip(), DEFAULT_CATEGORY, amount,
+                           source, row[account_col] if account_col is not None else "")
+
+    return mapRow
+
+
+@lru_cache(maxsize=4096)
+def parseDateMDY(text):
+    """Function to parse a mm/dd/yyyy date. Statements repeat the same dates, so results are cached."""
+
+    month, day, year = text.split("/")
+    return date(int(year), int(month), int(day))
+
+
+@lru_cache(maxsize=4096)
+def parseDateISO(text):
+    """Function to parse a yyyy-mm-dd date, with cached results."""
+
+    year, month, day = text.split("-")
+    return date(int(year), int(month), int(day))
+
+
+def dateParser(date_fmt):
+    """Function to get a (cached) parser for dates in the given format."""
+
+    if date_fmt == "%m/%d/%Y":
+        return parseDateMDY
+    if date_fmt == "%Y-%m-%d":
+        return parseDateISO
+
+    # fall back to strptime for other formats
+    @lru_cache(maxsize=4096)
+    def parseDate(text):
+        return datetime.strptime(text, date_fmt).date()
+
+    return parseDate
+
+
+# hits of the date caches are reported with the stats (if enabled)
+STATS.watchCache("parseDateMDY", parseDateMDY)
+STATS.watchCache("parseDateISO", parseDateISO)
+
+# formats of the supported bank statements
+registerSchema("simple", "Date,Description,Amount",
+               date_col=0, desc_col=1, amount_col=2, sign=-1)
+registerSchema("capital_one", "Transaction Date,Posted Date,Card No.,Description,Category,Debit,Credit",
+               date_col=0, desc_col=3, amount_col=5, date_fmt="%Y-%m-%d", sign=-1, credit_col=6, account_col=2)
+registerSchema("chase_checking", "Details,Posting Date,Description,Amount,Type,Balance,Check or Slip #",
+               date_col=1, desc_col=2, amount_col=3)
+registerSchema("chase_credit", "Transaction Date,Post Date,Description,Category,Type,Amount,Memo",
+               date_col=0, desc_col=2, amount_col=5)
@@ -0,0 +1,227 @@
+"""Index over the transaction rows used to filter the input list as the user types."""
+
+import bisect
+from array import array
+from datetime import date
+
+
+def parseRange(value, convert):
+    """Function to parse a range like from..to into (inclusive) bounds converted by convert, either end
+    can be left out (None) and a single value is a range of one value. Raises ValueError if malformed."""
+
+    lo, sep, hi = value.partition("..")
+    if not sep:
+        hi = lo
+    return (convert(lo) if lo else None, convert(hi) if hi else None)
+
+
+def parseQuery(text):
+    """Function to parse a filter query into (description text, date range, amount range, categories).
+    Terms like date:2023-01-01..2023-03-31 or amount:-50..0 give (inclusive) ranges, either
+    end of a range can be left out. category:food,rent gives the (lowercase) category names or
+    prefixes to match. All other words are matched as a description substring.
+    Raises ValueError for malformed ranges."""
+
+    words = []
+    date_range = (None, None)
+    amount_range = (None, None)
+    categories = ()
+    for term in text.split():
+        key, _, value = term.partition(":")
+        key = key.lower()
+        if key == "category" and value:
+            categories += tuple(name for name in value.lower().split(",") if name)
+        elif key in ("date", "amount") and value:
+            bounds = parseRange(value, date.fromisoformat if key == "date" else float)
+            if key == "date":
+                date_range = bounds
+            else:
+                amount_range = bounds
+        else:
+            words.append(term)
+
+    return " ".join(words).lower(), date_range, amount_range, categories
+
+
+class SearchIndex:
+    """Index over a list of rows (indexed by their rid) for description substrings and date/amount ranges.
+    Descriptions repeat a lot, so each distinct description is stored once, in one text blob that is
+    searched with str.find, together with the rids of the rows that have it. Dates and amounts are
+    kept in sorted arrays, so a range is found with bisect. Categories change during a session,
+    so they are checked on the candidate rows of the other conditions."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        # distinct (lowercase) descriptions, their ids and the rids of the rows with each description
+        self.desc_ids = {}
+        self.descs = []
+        self.postings = []
+        # description id of each row, by rid
+        self.row_desc = array("I")
+        # search blob and start offset of each description in it, extended with the descriptions added since
+        self._blob = ""
+        self._offsets = array("Q")
+        # sorted (keys, rids) of the dates and amounts, and the number of rows they hold (the first rids)
+        self._dates = ([], array("I"))
+        self._amounts = ([], array("I"))
+        self._num_sorted = 0
+
+    def add(self, rows):
+        """Function to add rows (with rid already set) to the index.
+        The search blob and sorted arrays are extended with the new rows at the next query that needs them."""
+
+        for row in rows:
+            desc = row.desc.lower()
+            desc_id = self.desc_ids.get(desc)
+            if desc_id is None:
+                desc_id = self.desc_ids[desc] = len(self.descs)
+                self.descs.append(desc)
+                self.postings.append(array("I"))
+            self.postings[desc_id].append(row.rid)
+            self.row_desc.append(desc_id)
+
+    def build(self):
+        """Function to add the rows added since the last build to the search blob and the sorted date and amount
+        arrays (called once the import is done, so that the first query is fast)."""
+
+        self._build_blob()
+        self._build_ranges()
+
+    def _build_blob(self):
+        """Function to append the new descriptions to the search blob, joined by newlines."""
+
+        start = len(self._offsets)
+        if start == len(self.descs):
+            return
+        pos = len(self._blob) + 1 if start else 0
+        for desc in self.descs[start:]:
+            self._offsets.append(pos)
+            pos += len(desc) + 1
+        self._blob += ("\n" if start else "") + "\n".join(self.descs[start:])
+
+    def _build_ranges(self):
+        """Function to merge the new rows into the sorted date and amount arrays."""
+
+        start = self._num_sorted
+        if start == len(self.row_desc):
+            return
+        rows = self.rows
+        dates, amounts = self._dates, self._amounts
+        if len(self.row_desc) - start >= start:
+            # mostly new rows (e.g. the first build): sorting them all is faster than inserting them one by one
+            start = 0
+            dates = amounts = ([], array("I"))
+        new_rids = range(start, len(self.row_desc))
+        self._dates = self._merge(dates, new_rids, lambda rid: rows[rid].date)
+        self._amounts = self._merge(amounts, new_rids, lambda rid: rows[rid].amount)
+        self._num_sorted = len(self.row_desc)
+
+    @staticmethod
+    def _merge(sorted_rids, new_rids, key):
+        """Function to merge new rids (larger than the sorted ones) into sorted (keys, rids), sorted by key
+        with ties in rid order. The runs between the insertion points are copied as slices."""
+
+        keys, rids = sorted_rids
+        by_key = sorted(new_rids, key=key)
+        new_keys = [key(rid) for rid in by_key]
+        if not keys:
+            return new_keys, array("I", by_key)
+        merged_keys = []
+        merged_rids = array("I")
+        start = 0
+        for new_key, rid in zip(new_keys, by_key):
+            # after the equal keys, which have smaller rids
+            pos = bisect.bisect_right(keys, new_key, start)
+            if pos > start:
+                merged_keys.extend(keys[start:pos])
+                merged_rids.extend(rids[start:pos])
+                start = pos
+            merged_keys.append(new_key)
+            merged_rids.append(rid)
+        merged_keys.extend(keys[start:])
+        merged_rids.extend(rids[start:])
+        return merged_keys, merged_rids
+
+    def _match_descs(self, text):
+        """Function to get the ids of the descriptions containing text."""
+
+        # for frequent matches a plain scan of the descriptions is faster than jumping between them
+        if self._blob.count(text) * 50 > len(self.descs):
+            return [desc_id for desc_id, desc in enumerate(self.descs) if text in desc]
+        matches = []
+        start = self._blob.find(text)
+        while start >= 0:
+            desc_id = bisect.bisect_right(self._offsets, start) - 1
+            matches.append(desc_id)
+            # continue the search at the next description
+            if desc_id + 1 >= len(self._offsets):
+                break
+            start = self._blob.find(text, self._offsets[desc_id + 1])
+        return matches
+
+    @staticmethod
+    def _range(keys, rids, lo, hi):
+        """Function to get the rids with keys in the inclusive range [lo, hi] (either end may be None)."""
+
+        i = 0 if lo is None else bisect.bisect_left(keys, lo)
+        j = len(keys) if hi is None else bisect.bisect_right(keys, hi)
+        return rids[i:j]
+
+    @staticmethod
+    def _category_matcher(categories):
+        """Function to get a function checking if a category matches one of the given names or prefixes
+        (lowercase), remembering the answer for each distinct category."""
+
+        known = {}
+
+        def matches(category):
+            match = known.get(category)
+            if match is None:
+                match = known[category] = category.lower().startswith(categories)
+            return match
+
+        return matches
+
+    def search(self, text="", date_range=(None, None), amount_range=(None, None), categories=()):
+        """Function to get the sorted rids of the rows matching all the given conditions.
+        Candidates are taken from the most selective condition, the others are checked per candidate."""
+
+        # date and amount ranges: rids in the range, from the sorted arrays (only needed for range queries)
+        ranges = []
+        if date_range != (None, None) or amount_range != (None, None):
+            self._build_ranges()
+        if date_range != (None, None):
+            ranges.append(("date", self._range(*self._dates, *date_range)))
+        if amount_range != (None, None):
+            ranges.append(("amount", self._range(*self._amounts, *amount_range)))
+        # description substring: rows of all the matching descriptions, unless a range is small enough
+        # that checking its rows is cheaper than searching the distinct descriptions (which runs in C)
+        smallest = min(ranges, key=lambda item: len(item[1]), default=None)
+        if text and (smallest is None or len(smallest[1]) * 25 > len(self.descs)):
+            self._build_blob()
+            desc_ids = self._match_descs(text) if "\n" not in text else []
+            size = sum(len(self.postings[desc_id]) for desc_id in desc_ids)
+            if smallest is None or size < len(smallest[1]):
+                smallest = ("text", [rid for desc_id in desc_ids for rid in self.postings[desc_id]])
+        if smallest is None:
+            smallest = ("all", range(len(self.row_desc)))
+        # check the remaining conditions on the smallest set of candidates
+        source, rids = smallest
+        rows = self.rows
+        if categories:
+            matches = self._category_matcher(tuple(categories))
+            rids = [rid for rid in rids if matches(rows[rid].category)]
+        if text and source != "text":
+            descs = self.descs
+            row_desc = self.row_desc
+            rids = [rid for rid in rids if text in descs[row_desc[rid]]]
+        if date_range != (None, None) and source != "date":
+            lo, hi = date_range
+            rids = [rid for rid in rids
+                    if (lo is None or rows[rid].date >= lo) and (hi is None or rows[rid].date <= hi)]
+        if amount_range != (None, None) and source != "amount":
+            lo, hi = amount_range
+            rids = [rid for rid in rids
+                    if (lo is None or rows[rid].amount >= lo) and (hi is None or rows[rid].amount <= hi)]
+        # all rows are already in rid order
+        return list(rids) if source == "all" else sorted(rids)
@@ -0,0 +1,136 @@
+"""Opt-in instrumentation of the hot paths: call counts and wall-clock timings.
+Enabled with the SPREADSHEET_GUI_STATS=1 environment variable or the --stats command line flag;
+when disabled, an instrumented call only costs one flag check."""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# environment variables: enable the instrumentation, and dump the stats to a file at exit
+ENV_VAR = "SPREADSHEET_GUI_STATS"
+ENV_FILE_VAR = "SPREADSHEET_GUI_STATS_FILE"
+
+
+class Stats:
+    """Registry of the call counts and timings (total and max, in seconds) of the instrumented code,
+    shared by the GUI and the worker threads."""
+
+    def __init__(self):
+        self.enabled = os.environ.get(ENV_VAR, "") not in ("", "0")
+        # name -> [count, total seconds, max seconds]
+        self.timings = {}
+        # lru caches reported with the timings (e.g. the date parsers)
+        self.caches = {}
+        self._lock = threading.Lock()
+
+    def enable(self, enabled=True):
+        """Function to switch the instrumentation on or off."""
+
+        self.enabled = enabled
+
+    def reset(self):
+        """Function to clear the recorded timings."""
+
+        with self._lock:
+            self.timings = {}
+
+    def add(self, name, seconds, count=1):
+        """Function to record count calls of name taking seconds in total."""
+
+        with self._lock:
+            entry = self.timings.get(name)
+            if entry is None:
+                entry = self.timings[name] = [0, 0.0, 0.0]
+            entry[0] += count
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    @contextmanager
+    def _timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def timer(self, name):
+        """Function to get a context manager timing its block under name (does nothing when disabled)."""
+
+        return self._timer(name) if self.enabled else _NULL_TIMER
+
+    def timed(self, name):
+        """Decorator recording the calls of a function under name."""
+
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.add(name, time.perf_counter() - start)
+            return wrapper
+
+        return decorator
+
+    def watchCache(self, name, func):
+        """Function to report the hits and misses of an lru_cache decorated function with the stats."""
+
+        self.caches[name] = func
+
+    def report(self):
+        """Function to get the recorded stats: timings sorted by total time, and cache hits/misses."""
+
+        with self._lock:
+            timings = [
+                {"name": name, "count": count, "total": total, "mean": total / count if count else 0.0, "max": max_}
+                for name, (count, total, max_) in self.timings.items()
+            ]
+        timings.sort(key=lambda item: item["total"], reverse=True)
+        caches = []
+        for name, func in self.caches.items():
+            info = func.cache_info()
+            caches.append({"name": name, "hits": info.hits, "misses": info.misses, "size": info.currsize})
+
+        return {"timings": timings, "caches": caches}
+
+    def formatReport(self):
+        """Function to format the recorded stats as a plain text table."""
+
+        report = self.report()
+        lines = [f"{'name':<22} {'count':>9} {'total (s)':>10} {'mean (ms)':>10} {'max (ms)':>10}"]
+        for item in report["timings"]:
+            lines.append(f"{item['name']:<22} {item['count']:>9} {item['total']:>10.3f} "
+                         f"{item['mean'] * 1000:>10.3f} {item['max'] * 1000:>10.3f}")
+        if report["caches"]:
+            lines.append("")
+            lines.append(f"{'cache':<22} {'hits':>9} {'misses':>10} {'size':>10}")
+            for item in report["caches"]:
+                lines.append(f"{item['name']:<22} {item['hits']:>9} {item['misses']:>10} {item['size']:>10}")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """Function to write the recorded stats to a json file."""
+
+        with open(path, "w") as fout:
+            json.dump(self.report(), fout, indent=2)
+
+
+class _NullTimer:
+    """Context manager doing nothing, returned by Stats.timer when the instrumentation is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+# stats of this process
+STATS = Stats()
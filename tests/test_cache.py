@@ -0,0 +1,78 @@
+"""Checks of the on-disk cache of the parsed input files."""
+
+import os
+import time
+
+import cache as cache_module
+from cache import ParseCache
+from utils import iterInputData, readInputFile
+
+STATEMENT = "Date,Description,Amount\n01/02/2023,COFFEE,3.00\n01/04/2023,RENT,900\n"
+
+
+def fields(rows):
+    return [(row.date, row.desc, row.amount, row.source, row.account, row.category) for row in rows]
+
+
+def test_cache_round_trip_and_invalidation(tmp_path):
+    path = tmp_path / "a.csv"
+    path.write_text(STATEMENT)
+    cache = ParseCache(cache_dir=str(tmp_path / "cache"))
+    assert cache.get(str(path), 50) is None
+    rows = readInputFile(str(path))
+    # categories set after parsing are not cached
+    rows[0].category = "Rent"
+    cache.put(str(path), 50, rows)
+    assert fields(cache.get(str(path), 50)) == fields(readInputFile(str(path)))
+    # entries are per description length
+    assert cache.get(str(path), 20) is None
+    # touched but unchanged: still valid (checked by hash)
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+    assert cache.get(str(path), 50) is not None
+    # same size, other content
+    path.write_text(STATEMENT.replace("COFFEE", "COFFEF"))
+    assert cache.get(str(path), 50) is None
+
+
+def test_cache_version_and_broken_entries(tmp_path, monkeypatch):
+    path = tmp_path / "a.csv"
+    path.write_text(STATEMENT)
+    cache = ParseCache(cache_dir=str(tmp_path / "cache"))
+    cache.put(str(path), 50, readInputFile(str(path)))
+    monkeypatch.setattr(cache_module, "PARSER_VERSION", cache_module.PARSER_VERSION + 1)
+    assert cache.get(str(path), 50) is None
+    monkeypatch.undo()
+    with open(cache._entry_path(str(path), 50), "wb") as fout:
+        fout.write(b"not a pickle")
+    assert cache.get(str(path), 50) is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache_dir = tmp_path / "cache"
+    paths = []
+    for i in range(3):
+        paths.append(tmp_path / f"{i}.csv")
+        paths[-1].write_text(STATEMENT)
+    cache = ParseCache(cache_dir=str(cache_dir))
+    cache.put(str(paths[0]), 50, readInputFile(str(paths[0])))
+    # room for two entries only
+    cache.max_bytes = 2 * os.path.getsize(cache._entry_path(str(paths[0]), 50))
+    cache.put(str(paths[1]), 50, readInputFile(str(paths[1])))
+    # the second entry is the least recently used one
+    os.utime(cache._entry_path(str(paths[1]), 50), (0, 0))
+    cache.put(str(paths[2]), 50, readInputFile(str(paths[2])))
+    assert [cache.get(str(path), 50) is not None for path in paths] == [True, False, True]
+
+
+def test_import_uses_cache(tmp_path):
+    paths = []
+    for i in range(2):
+        paths.append(tmp_path / f"{i}.csv")
+        paths[-1].write_text(STATEMENT)
+    cache = ParseCache(cache_dir=str(tmp_path / "cache"))
+    first = [fields(rows) for _, rows, _ in iterInputData([str(path) for path in paths], cache=cache)]
+    assert all(cache.get(str(path), 50) is not None for path in paths)
+    for workers in (1, 2):
+        again = [fields(rows) for _, rows, _ in iterInputData([str(path) for path in paths], workers=workers,
+                                                               cache=cache)]
+        assert again == first
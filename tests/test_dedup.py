@@ -0,0 +1,65 @@
+"""Checks of the detection of duplicate transactions across input files."""
+
+from datetime import date
+
+import pytest
+
+from dedup import DuplicateFilter, duplicateKey
+from transaction import Transaction
+
+
+def row(day, desc, amount, account="1111"):
+    return Transaction(date(2023, 1, day), desc, "Food", amount, "simple", account)
+
+
+def test_duplicates_across_files():
+    dup_filter = DuplicateFilter("drop")
+    # repeated purchases within a file are kept
+    first = dup_filter([row(1, "COFFEE", -3.0), row(1, "COFFEE", -3.0), row(2, "RENT", -900.0)], True)
+    assert len(first) == 3
+    # the next file only repeats as many copies as the first one had, spacing is ignored
+    second = dup_filter([row(1, "coffee", -3.0), row(1, "COFFEE", -3.0), row(1, "COFFEE  ", -3.0),
+                         row(2, "RENT", -900.0, account="2222")], True)
+    assert [(item.desc, item.account) for item in second] == [("COFFEE  ", "1111"), ("RENT", "2222")]
+    assert dup_filter.num_duplicates == 2
+
+
+def test_duplicates_batches_and_modes():
+    # the copies of a file count once the file is done, even if it comes in several batches
+    dup_filter = DuplicateFilter("flag")
+    assert dup_filter([row(1, "A", -1.0)], False)[0].dup is False
+    assert dup_filter([row(1, "A", -1.0)], True)[0].dup is False
+    flagged = dup_filter([row(1, "A", -1.0), row(1, "A", -1.0), row(1, "A", -1.0)], True)
+    assert [item.dup for item in flagged] == [True, True, False]
+    kept = DuplicateFilter("keep")
+    assert len(kept([row(1, "A", -1.0)], True) + kept([row(1, "A", -1.0)], True)) == 2
+    with pytest.raises(ValueError):
+        DuplicateFilter("merge")
+
+
+def test_duplicates_per_format_and_card():
+    # formats without a card number column: files of the same format are matched whatever their names
+    dup_filter = DuplicateFilter("flag")
+    dup_filter([row(1, "COFFEE", -3.0, account="")], True)
+    second = dup_filter([row(1, "COFFEE", -3.0, account=""),
+                         Transaction(date(2023, 1, 1), "COFFEE", "Food", -3.0, "chase_credit")], True)
+    assert [item.dup for item in second] == [True, False]
+    # rows of another card are not duplicates
+    dup_filter([row(2, "GAS", -40.0, account="1111")], True)
+    assert dup_filter([row(2, "GAS", -40.0, account="2222")], True)[0].dup is False
+
+
+def test_forget_file():
+    dup_filter = DuplicateFilter("flag")
+    dup_filter([row(1, "A", -1.0), row(1, "A", -1.0)], True, "monthly.csv")
+    dup_filter([row(1, "A", -1.0)], True, "other.csv")
+    assert dup_filter([row(1, "A", -1.0) for _ in range(3)], True, "quarterly.csv")[-1].dup is False
+    assert dup_filter.num_duplicates == 3
+    # the monthly file changed: its copies no longer count, the others' still do
+    dup_filter.forget("monthly.csv")
+    assert dup_filter.seen == {duplicateKey(row(1, "A", -1.0)): 3}
+    # as well as the duplicates found in a forgotten file
+    dup_filter.forget("quarterly.csv")
+    assert dup_filter.num_duplicates == 1
+    assert [item.dup for item in dup_filter([row(1, "A", -1.0) for _ in range(2)], True, "monthly.csv")] == [True, False]
+    dup_filter.forget("missing.csv")
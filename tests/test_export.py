@@ -0,0 +1,67 @@
+"""Checks of the export of the output list: full writes and appends of the new rows only."""
+
+import csv
+from datetime import date
+
+import pytest
+
+from export import appendExport, findNewRows, writeExport
+from transaction import Transaction
+
+
+def makeRows():
+    return [
+        Transaction(date(2023, 1, 1), "COFFEE", "Food", -3.0),
+        Transaction(date(2023, 1, 1), "COFFEE", "Food", -3.0),
+        Transaction(date(2023, 1, 2), "RENT, APT 4", "Rent", -900.0),
+        Transaction(date(2023, 1, 3), "GIFT", "Monthly Gift", 50.0),
+    ]
+
+
+def readRows(path):
+    with open(path, newline="") as fin:
+        return list(csv.reader(fin))
+
+
+def test_write_export_quotes_fields(tmp_path):
+    f_out = tmp_path / "out.csv"
+    writeExport(makeRows(), f_out, export_fmt=1)
+    rows = readRows(f_out)
+    assert rows[2] == ["RENT, APT 4", "01/02/2023", "Rent", "cc", "900.00", "", "900.00"]
+    # no amount in the amount column for the monthly gift
+    assert rows[3] == ["GIFT", "01/03/2023", "Monthly Gift", "cc", "-50.00", "", ""]
+    assert not list(tmp_path.glob("*.tmp"))
+    with pytest.raises(ValueError):
+        writeExport(makeRows(), f_out, export_fmt=3)
+
+
+def test_find_new_rows_counts_copies(tmp_path):
+    f_out = tmp_path / "out.csv"
+    rows = makeRows()
+    # nothing is exported yet, also when the file does not exist
+    assert len(findNewRows(rows, f_out)) == 4
+    writeExport(rows[1:], f_out)
+    # the file has one of the two coffees
+    assert [fields[0] for fields in findNewRows(rows, f_out)] == ["COFFEE"]
+    assert appendExport(rows, f_out) == 1
+    assert appendExport(rows, f_out) == 0
+    assert len(readRows(f_out)) == 4
+
+
+def test_find_new_rows_ignores_format_and_reports_categories(tmp_path):
+    f_out = tmp_path / "out.csv"
+    rows = makeRows()
+    writeExport(rows, f_out, export_fmt=1)
+    # the other format places the amount elsewhere, the rows are still the same transactions
+    assert findNewRows(rows, f_out, export_fmt=2) == []
+    changed = []
+    assert findNewRows(rows, f_out, categories=["Food", "Food", "Apartment", "Monthly Gift"],
+                       changed=changed) == []
+    assert [(fields[0], fields[2]) for fields in changed] == [("RENT, APT 4", "Apartment")]
+
+
+def test_append_adds_missing_line_break(tmp_path):
+    f_out = tmp_path / "out.csv"
+    f_out.write_text("OLD,12/31/2022,Food,cc,1.00,,1.00")
+    assert appendExport(makeRows()[:1], f_out) == 1
+    assert [fields[0] for fields in readRows(f_out)] == ["OLD", "COFFEE"]
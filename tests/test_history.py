@@ -0,0 +1,77 @@
+"""Checks of the SQLite history store against a plain scan of the stored rows."""
+
+import random
+from datetime import date
+
+import pytest
+
+from history import HistoryStore
+from journal import KeyIndex
+from transaction import CATEGORIES, Transaction
+
+
+def makeRows(rng, num_rows):
+    rows = [Transaction(date(2021 + rng.randint(0, 2), rng.randint(1, 12), rng.randint(1, 28)),
+                        rng.choice(["COFFEE", "RENT", "GAS"]), rng.choice(CATEGORIES),
+                        rng.choice([-3.0, -900.0, -40.1, 25.5]), rng.choice(["simple", "chase_credit"]))
+            for _ in range(num_rows)]
+    for rid, row in enumerate(rows):
+        row.rid = rid
+    keys = KeyIndex()
+    keys.add(rows)
+    return rows, keys.keys
+
+
+def fields(rows):
+    return sorted((row.date, row.desc, row.amount, row.source, row.category) for row in rows)
+
+
+@pytest.fixture
+def store(tmp_path):
+    history = HistoryStore(str(tmp_path / "history.sqlite"))
+    yield history
+    history.close()
+
+
+def test_add_rows_once(store):
+    rows, keys = makeRows(random.Random(0), 200)
+    assert store.dateSpan() == (None, None)
+    assert store.addRows(keys, rows) == 200
+    stored = fields(rows)
+    # importing the same statement again adds nothing, and keeps the stored categories
+    for row in rows:
+        row.category = "Apartment"
+    assert store.addRows(keys, rows) == 0
+    assert len(store) == 200
+    assert fields(store.query()) == stored
+    assert store.dateSpan() == (min(row.date for row in rows), max(row.date for row in rows))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_query_matches_scan(store, seed):
+    rng = random.Random(seed)
+    rows, keys = makeRows(rng, 300)
+    store.addRows(keys, rows)
+    # category changes are written back by key
+    changed = rng.sample(range(len(rows)), 50)
+    for rid in changed:
+        rows[rid].category = rng.choice(CATEGORIES)
+    store.setCategories([keys[rid] for rid in changed], [rows[rid].category for rid in changed])
+    for date_range, amount_range, categories in [
+        ((None, None), (None, None), ()),
+        ((date(2022, 1, 1), date(2022, 12, 31)), (None, None), ()),
+        ((None, date(2021, 6, 30)), (-50, 0), ()),
+        ((None, None), (-40.1, -40.1), ("food", "re")),
+        ((date(2023, 3, 1), None), (None, None), ("monthly",)),
+        ((None, None), (None, None), ("groceries",)),
+    ]:
+        expected = [row for row in rows
+                    if (date_range[0] is None or row.date >= date_range[0])
+                    and (date_range[1] is None or row.date <= date_range[1])
+                    and (amount_range[0] is None or row.amount >= amount_range[0])
+                    and (amount_range[1] is None or row.amount <= amount_range[1])
+                    and (not categories or row.category.lower().startswith(categories))]
+        result = store.query(date_range, amount_range, categories)
+        assert fields(result) == fields(expected)
+        # sorted by date
+        assert [row.date for row in result] == sorted(row.date for row in result)
@@ -0,0 +1,90 @@
+"""Checks of the row views behind the listboxes against plain (brute force) lists."""
+
+import random
+from datetime import date
+
+import pytest
+
+from rowtable import RowView
+from transaction import Transaction
+
+
+def makeRows(num_rows, seed=0):
+    rng = random.Random(seed)
+    rows = [Transaction(date(2023, 1, rng.randint(1, 28)), rng.choice(["A", "B", "C"]), "Food",
+                        rng.choice([-1.5, -20.0, 3.25])) for _ in range(num_rows)]
+    for rid, row in enumerate(rows):
+        row.rid = rid
+    return rows
+
+
+def expected(view):
+    """Function to get the items of a view by walking all its slots, as a plain list."""
+
+    items = [view.rows[item] if type(item) is int else item
+             for item, visible in zip(view.slots, view.visible) if visible]
+    return items + [view.padding]
+
+
+def checkView(view, rng):
+    items = expected(view)
+    assert len(view) == len(items)
+    assert [view[i] for i in range(len(view))] == items
+    assert view[-1] == view.padding
+    with pytest.raises(IndexError):
+        view[len(view)]
+    # few and many indices/rids take different paths
+    for size in (3, len(items)):
+        indices = sorted(rng.sample(range(len(items)), min(size, len(items))))
+        assert view.rows_at(indices) == [items[i] for i in indices if isinstance(items[i], Transaction)]
+        rids = rng.sample(range(len(view.rows)), min(size, len(view.rows)))
+        wanted = set(rids)
+        assert view.indices_of(rids) == [i for i, item in enumerate(items)
+                                         if isinstance(item, Transaction) and item.rid in wanted]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_rowview_matches_list(seed):
+    rng = random.Random(seed)
+    rows = makeRows(300, seed)
+    # file order with header and separator lines, a random half of the rows visible (the last 100 come later)
+    slots = ["header", "sep"] + list(range(200)) + ["sep"]
+    view = RowView(rows)
+    view.reset(slots, [1 if type(item) is str else rng.random() < 0.5 for item in slots])
+    checkView(view, rng)
+    next_rid = 200
+    for step in range(30):
+        if step % 10 == 9:
+            # rows of a new file added at the end (as during the import)
+            for rid in range(next_rid, next_rid + 30):
+                view.append(rid, visible=rng.random() < 0.5)
+            view.append("sep")
+            next_rid += 30
+        else:
+            # few and many rows flipped (updates of the tree, or a rebuild)
+            rids = rng.sample(range(len(rows)), rng.choice([2, 150]))
+            view.set_visible(rids, rng.random() < 0.5)
+        checkView(view, rng)
+
+
+def test_rowview_every_size():
+    # views built by append only, then flipped row by row: covers every tree size (powers of two included)
+    rng = random.Random(0)
+    rows = makeRows(70)
+    view = RowView(rows)
+    view.append("header")
+    for rid in range(len(rows)):
+        view.append(rid, visible=rng.random() < 0.5)
+        assert [view[i] for i in range(len(view))] == expected(view)
+        view.set_visible([rng.randrange(rid + 1)], rng.random() < 0.5)
+        assert [view[i] for i in range(len(view))] == expected(view)
+        assert view.indices_of(range(rid + 1)) == [i for i, item in enumerate(expected(view))
+                                                   if isinstance(item, Transaction)]
+
+
+def test_rowview_empty():
+    view = RowView([])
+    assert len(view) == 1
+    assert view[0] == ""
+    assert view.rows_at([0]) == []
+    assert view.indices_of([0]) == []
@@ -0,0 +1,61 @@
+"""Checks of the session journal: stable row keys and the replay of the recorded actions."""
+
+from datetime import date
+
+from journal import KeyIndex, SessionJournal, replayJournal
+from transaction import Transaction
+
+
+def row(day, desc, amount):
+    return Transaction(date(2023, 1, day), desc, "Food", amount, "simple")
+
+
+def test_key_index_and_replay():
+    rows = [row(1, "COFFEE", -3.0), row(1, "COFFEE", -3.0), row(2, "RENT", -900.0)]
+    for rid, item in enumerate(rows):
+        item.rid = rid
+    keys = KeyIndex()
+    keys.add(rows)
+    # identical rows are told apart by their count
+    assert [key[-1] for key in keys.keys] == [0, 1, 0]
+    assert keys.toRids(keys.toKeys([2, 0])) == [2, 0]
+    keys.remove([0])
+    assert keys.toRids(keys.toKeys([0, 1])) == [1]
+    # a re-imported copy does not take the key of the row still imported
+    again = row(1, "COFFEE", -3.0)
+    again.rid = 3
+    keys.add([again])
+    assert keys.keys[3] != keys.keys[1]
+    assert keys.toRids([keys.keys[3]]) == [3]
+
+    coffee_0, coffee_1, rent = (list(key) for key in keys.keys[:3])
+    records = [
+        {"op": "move", "dir": "in_to_out", "rows": [coffee_0]},
+        {"op": "snapshot", "out": [coffee_1], "cats": [[coffee_1, "Rent"]]},
+        {"op": "move", "dir": "in_to_out", "rows": [rent, coffee_0]},
+        {"op": "move", "dir": "out_to_in", "rows": [coffee_1]},
+        {"op": "cat", "rows": [rent, coffee_1], "cats": ["Apartment", "Food"]},
+    ]
+    out, cats = replayJournal(records)
+    # the snapshot replaces everything before it, the output keeps the order of the moves
+    assert out == [tuple(rent), tuple(coffee_0)]
+    assert cats == {tuple(coffee_1): "Food", tuple(rent): "Apartment"}
+    assert replayJournal([]) == ([], {})
+
+
+def test_journal_file_round_trip(tmp_path):
+    journal = SessionJournal(str(tmp_path / "journal.jsonl"), snapshot_every=2)
+    assert journal.load() == []
+    key = [738521, "COFFEE", -300, "simple", 0]
+    journal.append({"op": "move", "dir": "in_to_out", "rows": [key]})
+    assert not journal.needsCompaction()
+    journal.append({"op": "cat", "rows": [key], "cats": ["Rent"]})
+    assert journal.needsCompaction()
+    # a line cut short when the app was killed is ignored
+    with open(journal.path, "a") as fout:
+        fout.write('{"op": "mo')
+    records = journal.load()
+    assert replayJournal(records) == ([tuple(key)], {tuple(key): "Rent"})
+    journal.compact({"op": "snapshot", "out": [key], "cats": [[key, "Rent"]]})
+    assert not journal.needsCompaction()
+    assert replayJournal(journal.load()) == replayJournal(records)
@@ -0,0 +1,75 @@
+"""Checks of the lazy reader against the rows read by the import of the whole file."""
+
+import random
+
+import pytest
+
+import lazycsv
+from lazycsv import LazyRows, MappedCSV
+from utils import readInputFile
+
+
+def writeStatement(path, seed, newline="\n", final_newline=True):
+    """Function to write a simple statement with empty lines, autopay lines and words close to them."""
+
+    rng = random.Random(seed)
+    lines = ["Date,Description,Amount"]
+    for i in range(300):
+        kind = rng.random()
+        if kind < 0.1:
+            lines.append("")
+        elif kind < 0.2:
+            lines.append(f"01/{rng.randint(10, 28)}/2023,{rng.choice(['AUTOPAY', 'Automatic Payment - Thank'])},-{i}")
+        else:
+            desc = rng.choice(["AUTOZONE #12", "\"SHOP, INC\"", "auto parts", "COFFEE"])
+            lines.append(f"01/{rng.randint(10, 28)}/2023,{desc},{i}.25")
+    path.write_bytes((newline.join(lines) + (newline if final_newline else "")).encode())
+
+
+def fields(rows):
+    return [(row.date, row.desc, row.amount) for row in rows]
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+@pytest.mark.parametrize("final_newline", [True, False])
+@pytest.mark.parametrize("use_numpy", [True, False])
+@pytest.mark.parametrize("chunk", [7, 64 * 1024**2])
+def test_mapped_rows_match_import(tmp_path, monkeypatch, newline, final_newline, use_numpy, chunk):
+    if not use_numpy:
+        monkeypatch.setattr(lazycsv, "np", None)
+    elif lazycsv.np is None:
+        pytest.skip("numpy is not installed")
+    # small chunks: the line breaks and skipped words are also searched across chunk boundaries
+    monkeypatch.setattr(lazycsv, "INDEX_CHUNK", chunk)
+    path = tmp_path / "statement.csv"
+    writeStatement(path, seed=chunk, newline=newline, final_newline=final_newline)
+    mapped = MappedCSV(str(path))
+    try:
+        expected = fields(readInputFile(str(path)))
+        assert len(mapped) == len(expected)
+        assert fields(mapped.rows(range(len(mapped)))) == expected
+        assert fields([mapped.row(len(mapped) - 1)]) == expected[-1:]
+    finally:
+        mapped.close()
+
+
+def test_lazy_rows_across_files(tmp_path):
+    paths = []
+    for seed in range(3):
+        paths.append(tmp_path / f"{seed}.csv")
+        writeStatement(paths[-1], seed)
+    (tmp_path / "header_only.csv").write_text("Date,Description,Amount\n")
+    mapped = [MappedCSV(str(path)) for path in paths[:2] + [tmp_path / "header_only.csv"] + paths[2:]]
+    rows = LazyRows(mapped)
+    expected = [item for path in paths for item in fields(readInputFile(str(path)))]
+    assert len(rows) == len(expected)
+    assert [len(rids) for rids in rows.file_ranges()] == [len(item) for item in mapped]
+    # rows parsed out of order and across files keep their rid, and are parsed once
+    rids = random.Random(0).sample(range(len(rows)), 50)
+    assert fields(rows.load(rids)) == [expected[rid] for rid in rids]
+    assert rows[rids[0]] is rows.load([rids[0]])[0]
+    assert [row.rid for row in rows] == list(range(len(rows)))
+    assert fields(rows) == expected
+    with pytest.raises(IndexError):
+        rows.load([len(rows)])
+    rows.close()
@@ -0,0 +1,64 @@
+"""Checks of the rule engine that sets the categories at import."""
+
+import json
+import re
+from datetime import date
+
+import pytest
+
+from rules import Rule, RuleEngine, trieRegex
+from transaction import Transaction
+
+
+def row(desc, amount, source="simple"):
+    return Transaction(date(2023, 1, 1), desc, "Food", amount, source)
+
+
+def test_trie_regex_matches_all_words():
+    words = ["star", "starbucks", "stars", "uber", "ub", "a.b"]
+    regex = re.compile(f"(?=({trieRegex(words)}))")
+    for word in words:
+        assert regex.match(word).group(1) == word
+    # the longest word wins at a position, and special characters are escaped
+    assert [match.group(1) for match in regex.finditer("starbucks") if match.group(1)] == ["starbucks"]
+    assert not any(match.group(1) for match in regex.finditer("axb"))
+
+
+def test_rules_first_match_wins():
+    engine = RuleEngine([
+        Rule("Rent", contains=["star"], min_amount=-5),
+        Rule("Apartment", contains=["starbucks", "bucks"]),
+        Rule("Monthly Gift", source="chase_credit"),
+        Rule("Rent", contains="payroll"),
+    ])
+    rows = [
+        row("STARBUCKS #12", -4.5),    # prefix keyword of an earlier rule
+        row("STARBUCKS #12", -40.0),   # amount fails the first rule, falls through
+        row("BIG BUCKS", -40.0),
+        row("PAYROLL", 100.0, source="chase_credit"),
+        row("PAYROLL", 100.0),
+        row("NOTHING", -1.0),
+    ]
+    engine.categorize(rows)
+    assert [item.category for item in rows] == ["Rent", "Apartment", "Apartment", "Monthly Gift", "Rent", "Food"]
+    with pytest.raises(ValueError):
+        RuleEngine([Rule("Groceries")])
+
+
+def test_rules_from_file(tmp_path):
+    toml_file = tmp_path / "rules.toml"
+    toml_file.write_text('[[rule]]\ncategory = "Rent"\ncontains = ["rent"]\nmax_amount = 0\n')
+    json_file = tmp_path / "rules.json"
+    json_file.write_text(json.dumps({"rules": [{"category": "Rent", "contains": "rent", "max_amount": 0}]}))
+    for path in (toml_file, json_file):
+        rows = RuleEngine.fromFile(str(path)).categorize([row("RENT PAYMENT", -900.0), row("RENT REFUND", 900.0)])
+        assert [item.category for item in rows] == ["Rent", "Food"]
+
+
+@pytest.mark.parametrize("text", ['{"rules": [{"category": "Rent", "colour": "red"}]}', '["Rent"]',
+                                  '{"rules": [{"category": "Groceries"}]}', '{"rules": ['])
+def test_invalid_rules_file(tmp_path, text):
+    path = tmp_path / "rules.json"
+    path.write_text(text)
+    with pytest.raises(ValueError):
+        RuleEngine.fromFile(str(path))
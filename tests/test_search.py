@@ -0,0 +1,75 @@
+"""Checks of the filter queries and of the search index against a plain scan of the rows."""
+
+import random
+from datetime import date
+
+import pytest
+
+from search import SearchIndex, parseQuery
+from transaction import Transaction
+
+
+def scan(rows, text="", date_range=(None, None), amount_range=(None, None), categories=()):
+    """Function to get the rids matching a query by checking every row."""
+
+    (date_lo, date_hi), (amount_lo, amount_hi) = date_range, amount_range
+    return [row.rid for row in rows
+            if text in row.desc.lower()
+            and (date_lo is None or row.date >= date_lo) and (date_hi is None or row.date <= date_hi)
+            and (amount_lo is None or row.amount >= amount_lo) and (amount_hi is None or row.amount <= amount_hi)
+            and (not categories or row.category.lower().startswith(categories))]
+
+
+QUERIES = [
+    "star",
+    "bucks 1",
+    "date:2023-01-05..2023-01-09",
+    "amount:..-2",
+    "amount:0..",
+    "uber date:2023-01-20..",
+    "category:re,ap amount:-100..-1",
+    "amount:-2.5",
+    "nothing",
+]
+
+
+def test_parse_query():
+    assert parseQuery("Star  date:2023-01-01..2023-03-31 amount:-20.. category:Food,rent") == (
+        "star", (date(2023, 1, 1), date(2023, 3, 31)), (-20.0, None), ("food", "rent"))
+    assert parseQuery("amount:5 bucks")[1:3] == ((None, None), (5.0, 5.0))
+    with pytest.raises(ValueError):
+        parseQuery("date:2023-01")
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_search_matches_scan_while_rows_are_added(seed):
+    rng = random.Random(seed)
+    rows = []
+    index = SearchIndex(rows)
+    for _ in range(30):
+        # batches of all sizes, as during the import (large) and in watch mode (small)
+        batch = [Transaction(date(2023, 1, rng.randint(1, 28)),
+                             rng.choice(["Star bucks", "UBER", "STARBUCKS #2", "rent"]) + str(rng.randint(0, 30)),
+                             rng.choice(["Food", "Rent", "Apartment"]), rng.choice([-1.0, -2.5, 3.0, -100.0]))
+                 for _ in range(rng.choice([1, 5, 300]))]
+        for row in batch:
+            row.rid = len(rows)
+            rows.append(row)
+        index.add(batch)
+        for query in QUERIES:
+            assert index.search(*parseQuery(query)) == scan(rows, *parseQuery(query)), query
+    # categories are checked on the rows, so changes are seen right away
+    rows[0].category = "Monthly Gift"
+    assert index.search(*parseQuery("category:month")) == scan(rows, categories=("month",))
+
+
+def test_text_queries_do_not_sort():
+    rows = [Transaction(date(2023, 1, 1), "COFFEE", "Food", -3.0), Transaction(date(2023, 1, 2), "TEA", "Food", -2.0)]
+    for rid, row in enumerate(rows):
+        row.rid = rid
+    index = SearchIndex(rows)
+    index.add(rows)
+    assert index.search("tea") == [1]
+    assert index._num_sorted == 0
+    assert index.search("", amount_range=(-2.5, None)) == [1]
+    assert index._num_sorted == 2
@@ -0,0 +1,62 @@
+"""Checks of the running totals of the output list against totals recomputed from scratch."""
+
+import random
+from datetime import date
+
+from rowtable import RowView, dateOrder, moveRows, setCategories
+from totals import Totals, monthKey
+from transaction import CATEGORIES, Transaction
+
+
+def recompute(rows, in_output):
+    """Function to get the count, cents and the per category and per month entries of the output rows."""
+
+    by_category = {}
+    by_month = {}
+    for row in rows:
+        if in_output[row.rid] == 1:
+            for table, key in ((by_category, row.category), (by_month, monthKey(row))):
+                entry = table.setdefault(key, [0, 0])
+                entry[0] += 1
+                entry[1] += round(row.amount * 100)
+    count = sum(entry[0] for entry in by_category.values())
+    cents = sum(entry[1] for entry in by_category.values())
+    return count, cents, by_category, by_month
+
+
+def test_totals_follow_moves_and_category_changes():
+    rng = random.Random(0)
+    rows = [Transaction(date(2023, rng.randint(1, 3), rng.randint(1, 28)), "ROW", rng.choice(CATEGORIES),
+                        rng.choice([-0.1, -0.2, -19.99, 1500.0, 0.3])) for _ in range(200)]
+    for rid, row in enumerate(rows):
+        row.rid = rid
+    in_output = bytearray(len(rows))
+    list_in = RowView(rows)
+    list_in.reset(range(len(rows)), [1] * len(rows))
+    list_out = RowView(rows)
+    list_out.reset(*dateOrder(rows, in_output))
+    totals = Totals()
+    for _ in range(100):
+        rids = rng.sample(range(len(rows)), rng.choice([1, 20, 150]))
+        if rng.random() < 0.3:
+            setCategories(rids, [rng.choice(CATEGORIES) for _ in rids], rows, in_output, totals)
+        else:
+            moveRows(rids, rng.choice(["in_to_out", "out_to_in"]), rows, in_output, list_in, list_out, totals)
+        # amounts in cents, so adding and removing rows never drifts
+        assert (totals.count, totals.cents, totals.by_category, totals.by_month) == recompute(rows, in_output)
+        assert list_out.visible_rids() == [rid for rid in dateOrder(rows, in_output)[0] if in_output[rid] == 1]
+
+
+def test_changed_keys_and_empty_keys():
+    row = Transaction(date(2023, 1, 5), "ROW", "Food", -1.0)
+    totals = Totals()
+    totals.add([row])
+    assert totals.takeChanged() == {("category", "Food"), ("month", "2023-01")}
+    assert totals.takeChanged() == set()
+    totals.setCategories([row], ["Rent"])
+    row.category = "Rent"
+    assert totals.takeChanged() == {("category", "Food"), ("category", "Rent")}
+    # a key without rows is dropped, so it disappears from the view
+    assert totals.get("category", "Food") is None
+    totals.remove([row])
+    assert (totals.count, totals.cents, totals.by_category, totals.by_month) == (0, 0, {}, {})
@@ -0,0 +1,38 @@
+"""Checks of the reading of the input folder: supported formats, skipped files and batches."""
+
+import pytest
+
+from utils import iterInputData, listInputFiles
+
+SIMPLE = "Date,Description,Amount\n01/02/2023,COFFEE,3.00\n01/03/2023,AUTOPAY THANK YOU,-100\n\n01/04/2023,RENT,900\n"
+
+
+def writeFolder(folder):
+    (folder / "a.csv").write_text(SIMPLE)
+    (folder / "b_budget.csv").write_text("Month,Budget\nJanuary,100\n")
+    (folder / "c_empty.csv").write_text("")
+    (folder / "d.CSV").write_text(SIMPLE)
+    (folder / "exported_items.csv").write_text("COFFEE,01/02/2023,Food,cc,3.00,,3.00\n")
+    (folder / "notes.txt").write_text("not a statement")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_unsupported_and_empty_files_are_skipped(tmp_path, workers):
+    writeFolder(tmp_path)
+    files = listInputFiles(tmp_path)
+    assert [path.rsplit("/", 1)[-1] for path in files] == ["a.csv", "b_budget.csv", "c_empty.csv", "d.CSV"]
+    results = {}
+    for idx, rows, file_done in iterInputData(files, workers=workers, batch_size=1):
+        if rows is None:
+            results[idx] = None
+        else:
+            results.setdefault(idx, []).extend(row.desc for row in rows)
+    # the autopay and empty lines are not rows
+    assert results == {0: ["COFFEE", "RENT"], 1: None, 2: None, 3: ["COFFEE", "RENT"]}
+
+
+def test_batches_end_with_file_done(tmp_path):
+    writeFolder(tmp_path)
+    batches = [(idx, len(rows), file_done) for idx, rows, file_done
+               in iterInputData(listInputFiles(tmp_path, exclude=("b_budget", "c_empty")), batch_size=1)]
+    assert batches == [(0, 1, False), (0, 1, False), (0, 0, True), (1, 1, False), (1, 1, False), (1, 0, True)]
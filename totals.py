@@ -0,0 +1,97 @@
+"""Running totals of the rows in the output list, per category and per month."""
+
+
+def monthKey(row):
+    """Function to get the month of a row, as YYYY-MM (sorts in date order)."""
+
+    return f"{row.date.year:04d}-{row.date.month:02d}"
+
+
+class Totals:
+    """Counts and sums (in cents, so that adding and removing rows never drifts) of a set of rows,
+    per category and per month. Updated with the rows that change only, never recomputed from scratch.
+    The keys changed since the last call of takeChanged are kept, so a view only redraws those."""
+
+    def __init__(self):
+        # category -> [count, cents] and month -> [count, cents]
+        self.by_category = {}
+        self.by_month = {}
+        self.count = 0
+        self.cents = 0
+        # ("category", name) and ("month", YYYY-MM) keys changed since the last takeChanged
+        self.changed = set()
+        # month of each date seen so far (rows share few distinct dates)
+        self._month_of = {}
+
+    def _merge(self, kind, table, deltas):
+        """Function to add the [count, cents] deltas of a batch of rows to the totals of each key."""
+
+        for key, (count, cents) in deltas.items():
+            entry = table.get(key)
+            if entry is None:
+                entry = table[key] = [0, 0]
+            entry[0] += count
+            entry[1] += cents
+            # drop the keys without rows, so they disappear from the view
+            if entry[0] == 0:
+                del table[key]
+            self.changed.add((kind, key))
+
+    def add(self, rows, sign=1):
+        """Function to add rows to the totals (sign=-1 removes them)."""
+
+        # tally the batch per key first, then merge the (few) keys into the totals
+        cats = {}
+        months = {}
+        month_of = self._month_of
+        for row in rows:
+            cents = sign * round(row.amount * 100)
+            entry = cats.get(row.category)
+            if entry is None:
+                entry = cats[row.category] = [0, 0]
+            entry[0] += sign
+            entry[1] += cents
+            month = month_of.get(row.date)
+            if month is None:
+                month = month_of[row.date] = monthKey(row)
+            entry = months.get(month)
+            if entry is None:
+                entry = months[month] = [0, 0]
+            entry[0] += sign
+            entry[1] += cents
+        self._merge("category", self.by_category, cats)
+        self._merge("month", self.by_month, months)
+        self.count += sum(entry[0] for entry in cats.values())
+        self.cents += sum(entry[1] for entry in cats.values())
+
+    def remove(self, rows):
+        """Function to remove rows from the totals."""
+
+        self.add(rows, sign=-1)
+
+    def setCategories(self, rows, categories):
+        """Function to move rows from their current category to the new ones (called before the rows change)."""
+
+        cats = {}
+        for row, category in zip(rows, categories):
+            if category != row.category:
+                cents = round(row.amount * 100)
+                for key, sign in ((row.category, -1), (category, 1)):
+                    entry = cats.get(key)
+                    if entry is None:
+                        entry = cats[key] = [0, 0]
+                    entry[0] += sign
+                    entry[1] += sign * cents
+        self._merge("category", self.by_category, cats)
+
+    def get(self, kind, key):
+        """Function to get [count, cents] of a category or month, or None if it has no rows."""
+
+        table = self.by_category if kind == "category" else self.by_month
+        return table.get(key)
+
+    def takeChanged(self):
+        """Function to get (and reset) the keys changed since the last call."""
+
+        changed, self.changed = self.changed, set()
+        return changed
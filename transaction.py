@@ -0,0 +1,76 @@
+"""Define the compact record used to hold one transaction row."""
+
+from datetime import date
+
+# transaction categories, each gets a button in the GUI
+CATEGORIES = ["Apartment", "Food", "Rent", "Monthly Gift"]
+# category given to the rows at import
+DEFAULT_CATEGORY = "Food"
+
+
+class Transaction:
+    """Parsed transaction row: date, description, category and amount.
+    The text shown in the listboxes is rendered from these fields only when needed."""
+
+    # use slots to keep the memory footprint small for large imports
+    __slots__ = ("date", "desc", "category", "amount", "source", "account", "rid", "dup")
+
+    def __init__(self, date, desc, category, amount, source="", account=""):
+        self.date = date  # datetime.date
+        self.desc = desc  # description, already truncated to max display length
+        self.category = category  # category name, e.g. "Food"
+        self.amount = amount  # float, debit -, credit +
+        self.source = source  # name of the csv format (bank/account) the row comes from
+        self.account = account  # card number of the row, for the formats that have one (else empty)
+        self.rid = None  # row id, assigned when the row is added to the GUI
+        self.dup = False  # flagged as a duplicate of a row from another file
+
+    def __repr__(self):
+        return f"Transaction({self.date!r}, {self.desc!r}, {self.category!r}, {self.amount!r})"
+
+    def render(self, desc_len, cat_len):
+        """Function to render the row as one long string for display in a listbox."""
+
+        c1 = self.date.isoformat()
+        c2 = self.desc.ljust(desc_len)
+        c3 = self.category.ljust(cat_len)
+
+        line = f"{c1} | {c2} | {c3} | {self.amount:.2f}"
+
+        return line + "  (duplicate)" if self.dup else line
+
+
+def isTransaction(item):
+    """Function to check if a list item is a data row (as opposed to a header/separator line)."""
+
+    return isinstance(item, Transaction)
+
+
+def dateKey(row):
+    """Function to get the sort key of a row (its date)."""
+
+    return row.date
+
+def rowsToColumns(rows):
+    """Function to convert a list of rows to a tuple of column lists (dates as ordinals).
+    Columns of plain values are much faster to serialize than the row objects.
+    The category is left out: it is set after parsing (rules, user) and must not outlive the session."""
+
+    return (
+        [row.date.toordinal() for row in rows],
+        [row.desc for row in rows],
+        [row.amount for row in rows],
+        [row.source for row in rows],
+        [row.account for row in rows],
+    )
+
+
+def rowsFromColumns(columns):
+    """Function to convert a tuple of column lists back to a list of rows, with the default category."""
+
+    dates, descs, amounts, sources, accounts = columns
+    # dates repeat a lot, so convert each distinct ordinal only once
+    date_map = {ordinal: date.fromordinal(ordinal) for ordinal in set(dates)}
+
+    return [Transaction(date_map[d], desc, DEFAULT_CATEGORY, amount, source, account)
+            for d, desc, amount, source, account in zip(dates, descs, amounts, sources, accounts)]
@@ -2,104 +2,210 @@
 
 import csv
 import glob
-from datetime import datetime
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
 
+from dedup import DuplicateFilter
+from schemas import UnsupportedFormatError, compileSchema
+from stats import STATS
 
-def readInputData(input_dir, desc_len=50, cat_len=20, output_file="exported_items.csv"):
+
+def readInputData(input_dir, desc_len=50, cat_len=20, output_file="exported_items.csv", workers=1, cache=None,
+                  duplicates="keep", rules=None):
     """Function to read data from files living inside input_dir.
-    Data is later used to populate the input listbox of GUI."""
+    Data is later used to populate the input listbox of GUI.
+    Returns a list of Transaction rows, with the header and separator lines kept as plain strings.
+    If workers > 1, the files are parsed in parallel using a pool of processes.
+    If a ParseCache is given, only the files that changed since the last run are parsed.
+    Rows repeated across files are dropped, flagged or kept depending on duplicates (see DuplicateFilter).
+    If a RuleEngine is given, it sets the category of the rows in the same pass."""
+    
+    # get the (sorted) input files from input_dir
+    files = listInputFiles(input_dir, output_file=output_file)
+    # list to hold all the data rows from relevant files, starting with the header
+    header_line, sep_line = formatLines(desc_len, cat_len)
+    list_in = [header_line, sep_line]
+    dup_filter = DuplicateFilter(duplicates)
+    for _, rows, file_done in iterInputData(files, desc_len=desc_len, workers=workers, cache=cache):
+        # files in an unsupported format are skipped
+        if rows is None:
+            continue
+        rows = dup_filter(rows, file_done)
+        # categorize the rows using the rules, if any
+        if rules is not None:
+            rules.categorize(rows)
+        # add to input listbox
+        list_in.extend(rows)
+        # add a line to separate between the different data sources
+        if file_done:
+            list_in.append(sep_line)
+    # fix last line not showing properly b/c of scrollbar
+    list_in.append("")
+    # dict containing the params for formatting the various fields
+    format_dict = {'desc_len': desc_len, 'cat_len': cat_len}
+    
+    return list_in, format_dict
+
+def listInputFiles(input_dir, output_file="exported_items.csv", exclude=()):
+    """Function to get the csv files living inside input_dir, always in the same order.
+    The output file of the GUI and the files named in exclude (e.g. another output file) are left out."""
     
-    # set of currently fixed formatting parameters
-    date_len = 10
-    amt_len = 11
-    # list to hold all the data rows from relevant files
-    list_in = []
     # get files from input_dir
     files = glob.glob(f"{input_dir}/*.csv")
     files.extend(glob.glob(f"{input_dir}/*.CSV"))
     # on windows, glob + wildcard returns duplicates, fix by using set to select unique values
     files = list(set(files))
-    # exclude the ouput file, if it exists
-    files = [file for file in files if output_file not in file]
+    # exclude the ouput file(s), if they exist
+    excluded = (output_file, *exclude)
+    files = [file for file in files if not any(name in file for name in excluded)]
     # always open files in same order
-    files = sorted(files)
+    return sorted(files)
+
+def scanInputFiles(input_dir, output_file="exported_items.csv"):
+    """Function to get the (mtime, size) of the csv files living inside input_dir, keyed by file name.
+    Uses a single os.scandir call, cheap enough to be polled while the GUI runs."""
+    
+    stats = {}
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            # same files as listInputFiles
+            if not entry.name.endswith((".csv", ".CSV")) or output_file in entry.name or not entry.is_file():
+                continue
+            stat = entry.stat()
+            stats[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    
+    return stats
+
+def formatLines(desc_len, cat_len):
+    """Function to create the header line and the separator line shown in the listboxes."""
+    
+    # set of currently fixed formatting parameters
+    date_len = 10
+    amt_len = 11
     # add header with column descriptions, nicely formatted
     c1 = "Date".ljust(date_len)
     c2 = "Description".ljust(desc_len)
     c3 = "Category".ljust(cat_len)
     header_line = f"{c1} | {c2} | {c3} | Amount"
-    list_in.append(header_line)
     # define separator line between different files
     sep_items = ["-" * date_len, "-" * desc_len, "-" * cat_len, "-" * amt_len]
     sep_line = "-|-".join(sep_items)
-    list_in.append(sep_line)
-    for input_file in files:
-        # import data using csv module
-        with open(input_file) as fin:
-            csv_reader = csv.reader(fin, delimiter=',', quotechar='"')
-            header = ",".join(next(csv_reader))
-            for row in csv_reader:
-                row_str = " ".join(row).lower()
-                # skip the autopay lines and empty line
-                if ("autopay" in row_str) or ("automatic payment" in row_str) or (len(row) == 0):
-                    continue
-                # format row depending on csv header info
-                new_row = formatRow(row, header=header, desc_len=desc_len, cat_len=cat_len)
-                # create one long string per row
-                concat_row = " | ".join(new_row)
-                # add to input listbox
-                list_in.append(concat_row)
-        # add a line to separate between the different data sources
-        list_in.append(sep_line)
-    # fix last line not showing properly b/c of scrollbar
-    list_in.append("")
-    # dict containing the params for formatting the various fields
-    format_dict = {'desc_len': desc_len, 'cat_len': cat_len}
     
-    return list_in, format_dict
+    return header_line, sep_line
 
-def formatRow(row, header, desc_len, cat_len):
-    """Function to format a row given the header of the input csv file."""
+def iterInputData(files, desc_len=50, workers=1, batch_size=2000, cache=None):
+    """Generator to parse the given files in order, yielding (file index, rows, file done) tuples.
+    In serial mode the rows of each file are yielded in batches of batch_size, so they can be
+    shown before the whole file is parsed. If workers > 1, the files are parsed in parallel
+    using a pool of processes and each file is yielded in one go.
+    If a ParseCache is given, files that did not change since the last run are taken from the cache.
+    Files whose header matches no registered format are skipped, yielding (file index, None, True)."""
     
-    # use header to decide what info is contained in row
-    if header == "Date,Description,Amount":
-        # change the date to yyyy-mm-dd format
-        date = datetime.strptime(row[0], "%m/%d/%Y").strftime("%Y-%m-%d")
-        row[0] = date
-        # add a default category
-        row.insert(2, "Food")
-        # amount: ensure consistent signs, debit -, credit +
-        row[3] = f"{-1 * float(row[3]):.2f}"
-    elif header == "Transaction Date,Posted Date,Card No.,Description,Category,Debit,Credit":
-        idx = [0, 3, 4, 5, 6]
-        row = [row[id] for id in idx]
-        # amount: ensure consistent signs, debit -, credit +
-        if row[3] == "":
-            row[3] = row[4]
-        else:
-            row[3] = f"{-1 * float(row[3]):.2f}"
-        # remove credit info
-        row.pop(len(row) - 1)
-    elif header == "Details,Posting Date,Description,Amount,Type,Balance,Check or Slip #":
-        idx = [1, 2, 3]
-        row = [row[id] for id in idx]
-        # change the date to yyyy-mm-dd format
-        date = datetime.strptime(row[0], "%m/%d/%Y").strftime("%Y-%m-%d")
-        row[0] = date
-        # add a default category
-        row.insert(2, "Food")
-    elif header == "Transaction Date,Post Date,Description,Category,Type,Amount,Memo":
-        idx = [0, 2, 3, 5]
-        row = [row[id] for id in idx]
-        # change the date to yyyy-mm-dd format
-        date = datetime.strptime(row[0], "%m/%d/%Y").strftime("%Y-%m-%d")
-        row[0] = date
-    # set max length for description
-    if len(row[1]) < desc_len:
-        row[1] = row[1].ljust(desc_len)
-    else:
-        row[1] = row[1][:desc_len]
-    # set default category for all rows and max length for category
-    row[2] = "Food".ljust(cat_len)
+    def getCached(input_file):
+        return cache.get(input_file, desc_len) if cache is not None else None
+    
+    if workers > 1 and len(files) > 1:
+        # look up the files in the cache, only the others need to be parsed
+        cached = [getCached(input_file) for input_file in files]
+        to_parse = [input_file for input_file, rows in zip(files, cached) if rows is None]
+        read_file = partial(readSupportedFile, desc_len=desc_len)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # map returns the results in the same order as the (sorted) files
+            parsed = executor.map(read_file, to_parse)
+            for idx, (input_file, rows) in enumerate(zip(files, cached)):
+                # wall time per file, as seen by the consumer (waiting for the pool and processing the rows)
+                with STATS.timer("ingest_file"):
+                    if rows is None:
+                        rows = next(parsed)
+                        if cache is not None and rows is not None:
+                            cache.put(input_file, desc_len, rows)
+                    yield idx, rows, True
+        return
+    for idx, input_file in enumerate(files):
+        # wall time per file, including the processing of its rows by the consumer (duplicates, rules)
+        with STATS.timer("ingest_file"):
+            rows = getCached(input_file)
+            if rows is not None:
+                yield idx, rows, True
+                continue
+            rows = []
+            batch_start = 0
+            try:
+                for row in iterFileRows(input_file, desc_len=desc_len):
+                    rows.append(row)
+                    if len(rows) - batch_start == batch_size:
+                        yield idx, rows[batch_start:], False
+                        batch_start = len(rows)
+            except UnsupportedFormatError:
+                # raised before the first row, when the header is read
+                yield idx, None, True
+                continue
+            # stored before the last batch is handed over, as in parallel mode
+            if cache is not None:
+                cache.put(input_file, desc_len, rows)
+            yield idx, rows[batch_start:], True
+
+def readInputFile(input_file, desc_len=50):
+    """Function to read and format all data rows from a single csv file."""
     
-    return row
+    return list(iterFileRows(input_file, desc_len=desc_len))
+
+def readSupportedFile(input_file, desc_len=50):
+    """Function to read a single csv file like readInputFile, or get None if its format is not supported
+    (used in the worker processes, where an exception would stop the results of all the other files)."""
+    
+    try:
+        return readInputFile(input_file, desc_len=desc_len)
+    except UnsupportedFormatError:
+        return None
+
+def iterFileRows(input_file, desc_len=50):
+    """Generator to read and format the data rows from a single csv file, one at a time."""
+    
+    # import data using csv module
+    with open(input_file) as fin:
+        csv_reader = csv.reader(fin, delimiter=',', quotechar='"')
+        # an empty file has no header, like a file of an unknown format it is not a statement
+        header = next(csv_reader, None)
+        if header is None:
+            raise UnsupportedFormatError(f"Empty csv file: {input_file}")
+        header = ",".join(header)
+        # compile the mapper for this file format once, instead of checking the header per row
+        map_row = compileSchema(header, desc_len)
+        # time spent mapping the rows, recorded once per file as formatRow (if the stats are enabled)
+        timed = STATS.enabled
+        elapsed = 0.0
+        count = 0
+        for row in csv_reader:
+            row_str = " ".join(row).lower()
+            # skip the autopay lines and empty line
+            if ("autopay" in row_str) or ("automatic payment" in row_str) or (len(row) == 0):
+                continue
+            # format row depending on csv header info
+            if timed:
+                start = time.perf_counter()
+                item = map_row(row)
+                elapsed += time.perf_counter() - start
+                count += 1
+                yield item
+            else:
+                yield map_row(row)
+        if count:
+            STATS.add("formatRow", elapsed, count=count)
+
+def formatRow(row, header, desc_len):
+    """Function to format a row given the header of the input csv file.
+    Returns a Transaction with parsed date, description, category and amount."""
+    
+    # use header to decide what info is contained in row (mapper is compiled once per header)
+    return compileSchema(header, desc_len)(row)
+
+@lru_cache(maxsize=4096)
+def formatDate(date, date_fmt="%m/%d/%Y"):
+    """Function to convert a date to a string, with cached results since dates repeat a lot."""
+    
+    return date.strftime(date_fmt)
+
+STATS.watchCache("formatDate", formatDate)
@@ -1,16 +1,35 @@
 """Define the GUI windows class using TKinter."""
 
+import bisect
 import os
+import queue
+import sqlite3
 import sys
-from datetime import datetime
+import threading
+import time
+from collections import Counter
 
 # import tkinter depends on py version
 if sys.version_info.major > 2:
     import tkinter as tk
-    from tkinter import font, messagebox, ttk
+    from tkinter import filedialog, font, messagebox, ttk
 else:
     import Tkinter as tk
-    from TKinter import messagebox, ttk
+    from TKinter import filedialog, messagebox, ttk
+
+from dedup import DuplicateFilter, duplicateKey
+from export import EXPORT_FORMATS, appendExport, writeExport
+from journal import JOURNAL_FILE, KeyIndex, SessionJournal, actionRecord, replayJournal
+from lazycsv import LazyRows, MappedCSV
+from listview import RedrawScheduler, VirtualListbox
+from merchants import MerchantIndex
+from rowtable import RowView, dateOrder, moveRows, setCategories
+from schemas import UnsupportedFormatError
+from search import SearchIndex, parseQuery
+from stats import STATS
+from totals import Totals
+from transaction import CATEGORIES, dateKey, isTransaction
+from utils import formatLines, iterInputData, listInputFiles, scanInputFiles
 
 
 class Window(tk.Tk):
@@ -29,7 +48,7 @@ class Window(tk.Tk):
         self.win_height = 800
         
         # transaction categories
-        self.categories = ["Apartment", "Food", "Rent", "Monthly Gift"]
+        self.categories = list(CATEGORIES)
         
         # set some default max display lengths for list items
         self.desc_len = 30
@@ -40,21 +59,90 @@ class Window(tk.Tk):
         self.font = font.Font(family="Courier", size=self.font_size)
         
         # frames to hold the widgets
+        self.filter_frame = None  # filter box for the imported data
+        self.select_frame = None  # selection of rows by date/amount range and category
         self.in_frame = None  # listbox with imported data
         self.radio_frame = None  # radio buttons
         self.btn_frame = None  # buttons
         self.out_frame = None  # listbox with data to be exported
+        self.totals_frame = None  # totals of the output list
+        self.status_frame = None  # import progress
+        # redraws requested by the mutations, run once per event-loop turn
+        self.redraw = RedrawScheduler(self)
+        
+        # all imported rows (indexed by their rid), stored once, and whether each row is in the output list
+        # (0: input list, 1: output list, 2: retracted because its file was modified or removed)
+        self.rows = []
+        self.in_output = bytearray()
+        # lazy mode: rows is a LazyRows table over the memory-mapped input files, parsed as they are used
+        self.lazy = False
         
-        # lists and listboxes for input/output data
-        self.list_in = []
-        self.listvar_in = None
+        # views of the rows for input/output data, and their listboxes: moving rows only flips their
+        # visibility in both views. The input view keeps the file order, with the header and separator lines,
+        # the output view is sorted by date and rebuilt when rows were added since (out_dirty)
+        self.list_in = RowView(self.rows)
         self.listbox_in = None
-        self.list_out = []
-        self.listvar_out = None
+        self.list_out = RowView(self.rows)
         self.listbox_out = None
+        self.out_dirty = False
+        self.header_line = None
+        # totals of the output list per category and per month, updated with the moved/changed rows only,
+        # and the tree showing them
+        self.totals = Totals()
+        self.totals_tree = None
+        # index used to filter the input list, and the filtered input list (None if no filter)
+        self.search_index = SearchIndex(self.rows)
+        self.view_in = None
+        self.filter_var = tk.StringVar()
+        self.filter_entry = None
+        # query selecting the matching rows of both lists (same syntax as the filter)
+        self.select_var = tk.StringVar()
+        self.select_entry = None
+        # normalized merchant of each row and rows of each merchant, for the merchant context menu
+        self.merchant_index = MerchantIndex()
+        
         
         # variable for export format
         self.export_fmt = tk.IntVar()
+        
+        # background import: queue filled by the worker thread, polled from the main loop
+        self.poll_ms = 50
+        self.import_queue = None
+        self.import_files = 0
+        self.import_rows = 0
+        self.import_start = 0.0
+        self.dup_filter = None
+        # optional ParseCache of the parsed input files, also used for the files changed in watch mode
+        self.cache = None
+        # input files skipped because their csv format is not supported
+        self.skipped_files = []
+        # background export: thread writing the output file and queue with its result
+        self.export_thread = None
+        self.export_queue = None
+        # optional RuleEngine setting the categories of the imported rows
+        self.rules = None
+        # session journal in output_dir (started once the import is done), stable keys of the rows,
+        # categories set by the user (by rid) and undo/redo stacks of the actions
+        self.journal = None
+        self.row_keys = KeyIndex()
+        self.session_cats = {}
+        self.restored_rows = 0
+        self.undo_stack = []
+        self.redo_stack = []
+        # optional HistoryStore where the imported rows and the categories set by the user are kept across sessions
+        self.history = None
+        self.progress_bar = None
+        self.progress_label = None
+        # window showing the instrumentation stats (None if not open)
+        self.stats_window = None
+        
+        # watch mode: input files polled for changes, (mtime, size) and rids of the rows of each file
+        self.watch = False
+        self.watch_ms = 2000
+        self.watch_files = []
+        self.watch_stats = {}
+        self.file_rids = {}
+        self.sep_line = None
 
     def create_gui(self):
         """Main method to populate the GUI window with widgets."""
@@ -66,25 +154,62 @@ class Window(tk.Tk):
         self._update_geometry(self.win_width, self.win_height)
         
         # create frames to hold the widgets
+        self.filter_frame = ttk.Frame(self)
+        self.select_frame = ttk.Frame(self)
         self.in_frame = ttk.Frame(self)
         self.radio_frame = ttk.Frame(self)
         self.btn_frame = ttk.Frame(self)
         self.out_frame = ttk.Frame(self)
-        self.in_frame.place(relx=0.01, rely=0.01, relwidth=0.42, relheight=0.98)
+        self.totals_frame = ttk.Frame(self)
+        self.status_frame = ttk.Frame(self)
+        self.filter_frame.place(relx=0.01, rely=0.01, relwidth=0.42, relheight=0.035)
+        self.select_frame.place(relx=0.01, rely=0.05, relwidth=0.42, relheight=0.035)
+        self.in_frame.place(relx=0.01, rely=0.09, relwidth=0.42, relheight=0.86)
+        self.status_frame.place(relx=0.01, rely=0.955, relwidth=0.42, relheight=0.035)
         self.radio_frame.place(relx=0.45, rely=0.85, relwidth=0.1, relheight=0.1)
         self.btn_frame.place(relx=0.45, rely=0.125, relwidth=0.1, relheight=0.75)
-        self.out_frame.place(relx=0.57, rely=0.01, relwidth=0.42, relheight=0.98)
+        self.out_frame.place(relx=0.57, rely=0.01, relwidth=0.42, relheight=0.72)
+        self.totals_frame.place(relx=0.57, rely=0.74, relwidth=0.42, relheight=0.25)
         
         # create input and output lists
-        self.listvar_in = tk.StringVar(value=self.list_in)
-        self.listbox_in = self._create_listbox(self.in_frame, listvar=self.listvar_in)
-        self.listvar_out = tk.StringVar(value=self.list_out)
-        self.listbox_out = self._create_listbox(self.out_frame, listvar=self.listvar_out)
+        self.listbox_in = self._create_listbox(self.in_frame, self.list_in)
+        self.listbox_out = self._create_listbox(self.out_frame, self.list_out)
+        # create the totals panel of the output list
+        self.totals_tree = self._create_totals_tree(self.totals_frame)
+        
+        # add filter box for the input list: narrows the rows as you type
+        filter_label = tk.Label(self.filter_frame, text="Filter (text date:from..to amount:min..max):")
+        filter_label.place(relx=0, rely=0.5, anchor="w")
+        self.filter_entry = tk.Entry(self.filter_frame, textvariable=self.filter_var)
+        self.filter_entry.place(relx=0.45, rely=0.5, relwidth=0.55, anchor="w")
+        self.filter_entry.bind("<Escape>", lambda e: self.filter_var.set(""))
+        self.filter_var.trace_add("write", lambda *args: self._apply_filter())
+        # add selection box: selects the matching rows of both lists, to move or recategorize them in bulk
+        select_label = tk.Label(self.select_frame, text="Select (date:from..to amount:min..max category:name):")
+        select_label.place(relx=0, rely=0.5, anchor="w")
+        self.select_entry = tk.Entry(self.select_frame, textvariable=self.select_var)
+        self.select_entry.place(relx=0.45, rely=0.5, relwidth=0.45, anchor="w")
+        self.select_entry.bind("<Return>", lambda e: self._apply_selection())
+        self.select_entry.bind("<Escape>", lambda e: (self.select_var.set(""), self._apply_selection()))
+        self._create_button(self.select_frame, relx=0.95, rely=0.5, text="Select", command=self._apply_selection)
+        
+        # add progress bar and label for the background import
+        self.progress_bar = ttk.Progressbar(self.status_frame, orient="horizontal", mode="determinate")
+        self.progress_bar.place(relx=0, rely=0.5, relwidth=0.4, anchor="w")
+        self.progress_label = tk.Label(self.status_frame, text="", anchor="w")
+        self.progress_label.place(relx=0.42, rely=0.5, relwidth=0.58, anchor="w")
+        # button and shortcut to show the timings, if the instrumentation is enabled
+        if STATS.enabled:
+            self.progress_label.place_configure(relwidth=0.46)
+            self._create_button(self.status_frame, relx=0.94, rely=0.5, text="Stats", command=self.show_stats)
+            self.bind("<F12>", lambda e: self.show_stats())
         
         # add radio button to select which format to use for export
         self.export_fmt.set(1)
-        self._create_radio_button(self.radio_frame, relx=0.25, rely=0.5, text="Export 1", var=self.export_fmt, value=1)
-        self._create_radio_button(self.radio_frame, relx=0.75, rely=0.5, text="Export 2", var=self.export_fmt, value=2)
+        for i, (export_fmt, (label, _)) in enumerate(sorted(EXPORT_FORMATS.items())):
+            relx = (i + 0.5) / len(EXPORT_FORMATS)
+            self._create_radio_button(self.radio_frame, relx=relx, rely=0.5, text=label, var=self.export_fmt,
+                                      value=export_fmt)
         
         # add buttons to interact with data
         btn_relx = 0.5
@@ -125,6 +250,24 @@ class Window(tk.Tk):
         self.out_label.place(relx=btn_relx, rely=0.85, anchor="center")
         # button: export output list to csv
         self._create_button(self.btn_frame, btn_relx, 0.9, text="Export", command=self._export_with_confirmation)
+        # buttons and shortcuts: undo / redo the last moves and category changes
+        self._create_button(self.btn_frame, btn_relx - dx, 0.96, text="Undo", command=self.undo)
+        self._create_button(self.btn_frame, btn_relx + dx, 0.96, text="Redo", command=self.redo)
+        self.bind("<Control-z>", lambda e: self._list_shortcut(e, self.undo))
+        self.bind("<Control-y>", lambda e: self._list_shortcut(e, self.redo))
+        self.bind("<Control-Shift-Z>", lambda e: self._list_shortcut(e, self.redo))
+        # context menu and shortcut: select or recategorize all the rows of the merchants of the selected rows
+        for listbox in (self.listbox_in, self.listbox_out):
+            listbox.listbox.bind("<Button-3>", lambda e, listbox=listbox: self._show_merchant_menu(e, listbox))
+        self.bind("<Control-m>", lambda e: self._list_shortcut(e, lambda: self.select_merchant(self._selected_rids())))
+
+    @staticmethod
+    def _list_shortcut(event, action):
+        """Function to run the action of a window shortcut, unless the key was typed in a text box
+        (e.g. Ctrl+Z in the filter box does not undo a move)."""
+        
+        if not isinstance(event.widget, tk.Entry):
+            action()
 
     def _update_geometry(self, width=800, height=600):
         """Function to update width and height for main GUI window."""
@@ -135,26 +278,34 @@ class Window(tk.Tk):
         y = (screen_height - height) // 2
         self.geometry(f"{width}x{height}+{x}+{y}")
 
-    def _create_listbox(self, frame, listvar=None):
-        """Function to create a tkinter Listbox."""
+    def _create_listbox(self, frame, lst):
+        """Function to create a virtualized listbox showing the rows of lst.
+        Only the rows scrolled into view are rendered, so large lists stay cheap to display."""
         
-        # define listbox with multiple selection and scrollbars h/v
-        listbox = tk.Listbox(frame, selectmode=tk.EXTENDED, font=self.font, listvariable=listvar)
-        scrollbarH = tk.Scrollbar(listbox, orient="horizontal")
-        scrollbarV = tk.Scrollbar(listbox, orient="vertical")
+        listbox = VirtualListbox(frame, font=self.font, render_item=self._render_item, scheduler=self.redraw)
+        listbox.set_items(lst)
         
-        # configure scrollbars and listbox so they know about each other
-        scrollbarH.config(command=listbox.xview)
-        scrollbarV.config(command=listbox.yview)
-        listbox.config(xscrollcommand=scrollbarH.set, yscrollcommand=scrollbarV.set)
+        return listbox
+    
+    def _create_totals_tree(self, frame):
+        """Function to create the tree showing the number of rows and the total amount of the output list,
+        per category and per month (one branch each)."""
         
-        # place the elements
-        scrollbarH.pack(side="bottom", fill="x")
-        scrollbarV.pack(side="right", fill="y")
-        # place listbox to cover the whole frame
-        listbox.place(relx=0, rely=0, relwidth=1, relheight=1)
+        tree = ttk.Treeview(frame, columns=("count", "total"))
+        tree.heading("#0", text="Output list")
+        tree.heading("count", text="Rows")
+        tree.heading("total", text="Total")
+        tree.column("count", anchor="e", width=80)
+        tree.column("total", anchor="e", width=120)
+        scrollbar = tk.Scrollbar(frame, orient="vertical", command=tree.yview)
+        tree.config(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side="right", fill="y")
+        tree.pack(side="left", fill="both", expand=True)
+        tree.insert("", "end", iid="all", text="All", values=(0, "0.00"))
+        tree.insert("", "end", iid="category", text="Per category", open=True)
+        tree.insert("", "end", iid="month", text="Per month", open=True)
         
-        return listbox
+        return tree
     
     def _create_button(self, frame, relx, rely, text, command):
         """Function to add button for a particular command."""
@@ -175,146 +326,900 @@ class Window(tk.Tk):
         if (self.font_size <= 0) or (self.font_size > 30):
             self.font_size = 12
         self.font.config(size=self.font_size)
+        # the number of rows that fit in the listboxes depends on the font size
+        self.listbox_in.invalidate()
+        self.listbox_out.invalidate()
 
-    def _move_items(self, selection, left_lst, right_lst, sort_right_lst=False):
-        """Move selected items (as given by selection) from left list to right list.
-        Optionally sorts the right list."""
-        
-        # before adding any items, remove the empty line at the end
-        if len(right_lst) > 0:
-            right_lst.pop()
-        # subselect rows that can be moved (e.g. not header, not separator line)
-        allowed_sel = []
-        for i in selection:
-            if (left_lst[i] == "") or (left_lst[i][:4] in ["Date", "----"]):
-                continue
-            allowed_sel.append(i)
-        # move allowed items
-        for i in allowed_sel:
-            right_lst.append(left_lst[i])
-        # sort the rows by date, only if moving from in to out
-        if sort_right_lst:
-            right_lst.sort(key=lambda x: x[:10], reverse=False)
-        # fix last line not showing properly b/c of scrollbar
-        right_lst.append("")
-        # delete selected items from left list by sorting indices in reverse order
-        for item in allowed_sel[::-1]:
-            left_lst.pop(item)
-    
+    def _render_item(self, item):
+        """Function to render a row of a data list as a string for display in a listbox."""
+        
+        return item.render(self.desc_len, self.cat_len) if isTransaction(item) else item
+
+    @STATS.timed("move")
     def _move_items_dir(self, direction="in_to_out"):
         """Moves items from input listbox to output listbox or vice versa."""
         
         # define the two allowed directions
         if direction == "in_to_out":
             left_lb = self.listbox_in
-            left_lst = self.list_in
-            left_lvar = self.listvar_in
-            right_lst = self.list_out
-            right_lvar = self.listvar_out
-            sort_right_lst = True
+            # move from the filtered input list, if a filter is active
+            left_view = self.list_in if self.view_in is None else self.view_in
         elif direction == "out_to_in":
             left_lb = self.listbox_out
-            left_lst = self.list_out
-            left_lvar = self.listvar_out
-            right_lst = self.list_in
-            right_lvar = self.listvar_in
-            sort_right_lst = False
+            left_view = self.list_out
         else:
             print("Unsupported direction provided to _move_items_dir, please double check!")
             return
         
-        # move the selected items
-        self._move_items(left_lb.curselection(), left_lst, right_lst, sort_right_lst=sort_right_lst)
-        
-        # post-processing: update the StringVars to propagate changes to ListBoxes
-        left_lvar.set(left_lst)
-        right_lvar.set(right_lst)
-        
-        # clear the current selection to start fresh for the next move
-        left_lb.select_clear(0, tk.END)
+        # get the selected rows (skipping header, separator and padding lines) and move them
+        rows = self._rows_at(left_view, left_lb.curselection())
+        moved = self._move_rows([row.rid for row in rows], direction)
+        if moved:
+            self._record_action(("move", direction, [row.rid for row in moved]))
         
     def _clear_selection(self):
         """Clears the current selection of the input listbox."""
         
         self.listbox_in.selection_clear(0, tk.END)
             
+    @STATS.timed("change_category")
     def _change_category(self, category):
         """Change selected item category to provided category.
         Applies only to items in the output list."""
         
         selections = self.listbox_out.curselection()
-        for i in selections:
-            entry = self.list_out[i]
-            entry_items = entry.split(" | ")
-            old_cat = entry_items[2].strip()
-            # change the category field only if new value is different from old value
-            if category != old_cat:
-                entry_items[2] = category.ljust(self.cat_len)
-                new_entry = " | ".join(entry_items)
-                # replace entry with formatted entry
-                self.list_out[i] = new_entry
-        # update the StringVar
-        self.listvar_out.set(self.list_out)
+        # skip the empty line at the end of the list
+        rows = self._rows_at(self.list_out, selections)
+        if not rows:
+            return
+        rids = [row.rid for row in rows]
+        old_cats = [row.category for row in rows]
+        new_cats = [category] * len(rows)
+        self._set_categories(rids, new_cats)
+        self._record_action(("cat", rids, new_cats, old_cats))
+    
+    def _set_categories(self, rids, categories):
+        """Function to set the category of each row given by rid."""
+        
+        # the totals change with the rows of the output list that change category
+        if setCategories(rids, categories, self.rows, self.in_output, self.totals):
+            self.redraw.request(self._refresh_totals)
+        for rid, category in zip(rids, categories):
+            self.session_cats[rid] = category
+        if self.history is not None:
+            keys = self.row_keys.keys
+            self._write_history(self.history.setCategories, [keys[rid] for rid in rids], categories)
+        # redraw the changed rows, if they are in view
+        self._invalidate_rows(self.listbox_in, self.list_in if self.view_in is None else self.view_in, rids)
+        self._invalidate_rows(self.listbox_out, self.list_out, rids)
+    
+    @staticmethod
+    def _invalidate_rows(listbox, view, rids):
+        """Function to mark the rows given by rid as changed in a listbox (RowView), or all rows (filtered list)."""
+        
+        if not isinstance(view, RowView):
+            listbox.invalidate()
+            return
+        indices = view.indices_of(rids)
+        if indices:
+            listbox.invalidate(indices[0], indices[-1])
+    
+    def _refresh_totals(self):
+        """Function to redraw the categories and months of the totals panel that changed since the last redraw."""
+        
+        tree = self.totals_tree
+        totals = self.totals
+        for kind, key in sorted(totals.takeChanged()):
+            iid = f"{kind}:{key}"
+            entry = totals.get(kind, key)
+            if entry is None:
+                if tree.exists(iid):
+                    tree.delete(iid)
+            elif tree.exists(iid):
+                tree.item(iid, values=(entry[0], f"{entry[1] / 100:.2f}"))
+            else:
+                # keep the categories sorted by name and the months in date order
+                index = bisect.bisect_left(tree.get_children(kind), iid)
+                tree.insert(kind, index, iid=iid, text=key, values=(entry[0], f"{entry[1] / 100:.2f}"))
+        tree.item("all", values=(totals.count, f"{totals.cents / 100:.2f}"))
+    
+    @staticmethod
+    def _rows_at(view, selection):
+        """Function to get the rows at the selected positions of a view (RowView or filtered list),
+        skipping the header, separator and padding lines."""
+        
+        if isinstance(view, RowView):
+            return view.rows_at(selection)
+        return [view[i] for i in selection if isTransaction(view[i])]
+    
+    def _move_rows(self, rids, direction):
+        """Function to move the rows given by rid between the input and output lists (also used when undoing
+        or restoring a session). The rows stay in place: only their membership and visibility bits change.
+        Returns the moved rows."""
+        
+        self._sync_output()
+        # the output view of lazy mode only holds the output rows (so that the other rows are never parsed),
+        # it is rebuilt instead
+        list_out = None if self.lazy else self.list_out
+        # skip the rows already on that side (or retracted)
+        rids = moveRows(rids, direction, self.rows, self.in_output, self.list_in, list_out, self.totals)
+        if rids:
+            if self.lazy:
+                self.out_dirty = True
+                self._sync_output()
+            self.redraw.request(self._refresh_totals)
+            # the filtered view may have changed as well
+            if self.view_in is not None:
+                self._apply_filter()
+        # clear the current selections to start fresh for the next move (redrawn on the next idle turn)
+        self.listbox_in.select_clear(0, tk.END)
+        self.listbox_out.select_clear(0, tk.END)
+        
+        return [self.rows[rid] for rid in rids]
+    
+    def _sync_output(self):
+        """Function to rebuild the date order of the output view if rows were added since it was built."""
+        
+        if not self.out_dirty:
+            return
+        in_output = self.in_output
+        if self.lazy:
+            # sort the output rows only (the search of 1 bytes runs in C)
+            rids = []
+            rid = in_output.find(1)
+            while rid >= 0:
+                rids.append(rid)
+                rid = in_output.find(1, rid + 1)
+            rows = self.rows.load(rids)
+            order = [row.rid for row in sorted(rows, key=dateKey)]
+            self.list_out.reset(order, [1] * len(order))
+        else:
+            self.list_out.reset(*dateOrder(self.rows, in_output))
+        self.out_dirty = False
+    
+    def _rebuild_input(self):
+        """Function to rebuild the input view from the rows of each file, in file order
+        (e.g. when watch mode adds or removes files)."""
+        
+        slots = [self.header_line, self.sep_line]
+        for name in self.watch_files:
+            slots.extend(self.file_rids.get(name, []))
+            slots.append(self.sep_line)
+        in_output = self.in_output
+        self.list_in.reset(slots, [type(item) is not int or in_output[item] == 0 for item in slots])
+    
+    def _record_action(self, action):
+        """Function to record an action done by the user: push it on the undo stack and log it in the journal.
+        Actions are ("move", direction, rids) or ("cat", rids, new categories, old categories)."""
+        
+        self.undo_stack.append(action)
+        self.redo_stack.clear()
+        self._journal_action(action)
+    
+    def _journal_action(self, action):
+        """Function to append an action to the session journal, compacting it from time to time."""
+        
+        if self.journal is None:
+            return
+        try:
+            self.journal.append(actionRecord(self.row_keys, action))
+            if self.journal.needsCompaction():
+                self.journal.compact(self._session_snapshot())
+        except OSError:
+            # the session can not be saved (e.g. read-only folder), keep working without the journal
+            self.journal = None
+    
+    def _session_snapshot(self):
+        """Function to get the snapshot record of the current session, for the journal."""
+        
+        self._sync_output()
+        out = self.list_out.visible_rids()
+        keys = self.row_keys.keys
+        cats = [[list(keys[rid]), category] for rid, category in self.session_cats.items()]
+        
+        return {"op": "snapshot", "out": self.row_keys.toKeys(out), "cats": cats}
+    
+    def _restore_session(self):
+        """Function to restore the moves and category changes of the last session on the same output folder,
+        by replaying its journal over the imported rows, and to start the journal of this session."""
+        
+        journal = SessionJournal(os.path.join(self.output_dir, JOURNAL_FILE))
+        out_keys, cats = replayJournal(journal.load())
+        # move all the rows of the last session at once (skipping the ones moved during the import)
+        rids = [rid for rid in self.row_keys.toRids(out_keys) if not self.in_output[rid]]
+        if rids:
+            self._move_rows(rids, "in_to_out")
+        self.restored_rows = len(rids)
+        cat_rids = self.row_keys.toRids(cats)
+        if cat_rids:
+            keys = self.row_keys.keys
+            self._set_categories(cat_rids, [cats[keys[rid]] for rid in cat_rids])
+        # start this session with a snapshot of the current state
+        try:
+            journal.compact(self._session_snapshot())
+            self.journal = journal
+        except OSError:
+            self.journal = None
+    
+    def _apply_action(self, action):
+        """Function to (re)do an action and log it in the journal."""
+        
+        if action[0] == "move":
+            self._move_rows(action[2], action[1])
+        else:
+            self._set_categories(action[1], action[2])
+        self._journal_action(action)
+    
+    @staticmethod
+    def _inverse_action(action):
+        """Function to get the action undoing the given action."""
+        
+        if action[0] == "move":
+            direction = "out_to_in" if action[1] == "in_to_out" else "in_to_out"
+            return ("move", direction, action[2])
+        _, rids, new_cats, old_cats = action
+        return ("cat", rids, old_cats, new_cats)
+    
+    def undo(self):
+        """Undo the last move or category change."""
+        
+        if not self.undo_stack:
+            return
+        action = self.undo_stack.pop()
+        self._apply_action(self._inverse_action(action))
+        self.redo_stack.append(action)
+    
+    def redo(self):
+        """Redo the last undone move or category change."""
+        
+        if not self.redo_stack:
+            return
+        action = self.redo_stack.pop()
+        self._apply_action(action)
+        self.undo_stack.append(action)
             
-    def _export_all(self, f_out):
-        """Export items from output list to csv file f_out."""
-        
-        # map between order of fields in listbox and in output file
-        field_map = {0: 1, 1: 0, 2: 2, 4: 3}
-        # index where to duplicate the amount value based on chosen export format
-        amount_idx = 6 if self.export_fmt.get() == 1 else 5
-        field_map[amount_idx] = 3
-        num_new_fields = len(field_map) + 2
-        
-        all_items = self.listbox_out.get(0, tk.END)[:-1]  # last item is empty line
-        with open(f_out, "w") as f:
-            for item in all_items:
-                fields = item.split(" | ")
-                fields = [field.strip() for field in fields]
-                # construct list with new fields to write in output file
-                new_fields = [""] * num_new_fields
-                for k, v in field_map.items():
-                    new_fields[k] = fields[v]
-                ## postprocessing
-                # add default value for purchase method
-                new_fields[3] = "cc"
-                # change date format
-                date = datetime.strptime(new_fields[1], "%Y-%m-%d").strftime("%m/%d/%Y")
-                new_fields[1] = date
-                # fix sign for amount fields
-                for i in [4, amount_idx]:
-                    new_fields[i] = f"{-1 * float(new_fields[i]):.2f}"
-                # special case: monthly gift
-                if new_fields[2] == "Monthly Gift":
-                    new_fields[amount_idx] = ""
-                new_entry = ",".join(new_fields)
-                f.write(new_entry + "\n")
-        # print(f"Exported data to file: {f_out}")
+    def _export_all(self, f_out, append=False):
+        """Export items from output list to csv file f_out, in a background thread.
+        With append, only the rows not in f_out yet are added at its end."""
+        
+        # only one export at a time
+        if self.export_thread is not None and self.export_thread.is_alive():
+            return
+        # skip the empty line at the end of the list
+        self._sync_output()
+        rows = [self.rows[rid] for rid in self.list_out.visible_rids()]
+        # snapshot of the categories, which can still be changed while the export runs
+        categories = [row.category for row in rows]
+        self.export_queue = queue.Queue()
+        # not a daemon thread, so that closing the window does not interrupt the export
+        self.export_thread = threading.Thread(target=self._export_worker,
+                                              args=(rows, categories, f_out, self.export_fmt.get(), append))
+        self.export_thread.start()
+        action = "Appending new rows of" if append else "Exporting"
+        self.progress_label.config(text=f"{action} {len(rows)} rows to {f_out}")
+        self.after(self.poll_ms, self._poll_export, f_out)
+    
+    def _export_worker(self, rows, categories, f_out, export_fmt, append=False):
+        """Function running in the export thread: write the rows and put the result on the queue."""
+        
+        try:
+            if append:
+                changed = []
+                num_new = appendExport(rows, f_out, export_fmt=export_fmt, categories=categories, changed=changed)
+            else:
+                writeExport(rows, f_out, export_fmt=export_fmt, categories=categories)
+        except Exception as exc:
+            self.export_queue.put(("error", exc))
+        else:
+            self.export_queue.put(("appended", (num_new, len(rows), len(changed))) if append
+                                  else ("done", len(rows)))
+    
+    def _poll_export(self, f_out):
+        """Function to report the result of the background export, rescheduled with after() until it is done."""
+        
+        try:
+            kind, payload = self.export_queue.get_nowait()
+        except queue.Empty:
+            self.after(self.poll_ms, self._poll_export, f_out)
+            return
+        if kind == "error":
+            self.progress_label.config(text="")
+            messagebox.showerror("Export error", f"Could not export to {f_out}:\n{payload}", parent=self)
+        elif kind == "appended":
+            num_new, num_rows, num_changed = payload
+            text = f"Appended {num_new} new rows to {f_out} ({num_rows - num_new} already in the file)"
+            if num_changed:
+                # the file keeps the category they were exported with
+                text += f", {num_changed} of them with another category (overwrite the file to update it)"
+            self.progress_label.config(text=text)
+        else:
+            self.progress_label.config(text=f"Exported {payload} rows to {f_out}")
     
     def _export_with_confirmation(self):
-        """Export items to csv using a confirmation box for overwriting."""
+        """Export items to csv using a confirmation box for appending to or overwriting an existing file."""
         
         f_out = os.path.join(self.output_dir, self.f_out)
-        # check if file exists
-        if os.path.exists(f_out):
-            title = "Confirmation"
-            msg = f"The file {f_out} already exists. Do you want to overwrite it?"
-            # pop overwrite window
-            response = messagebox.askyesno(title, msg, parent=self)
-        # export if file doesn't exist or response is yes
-        if not os.path.exists(f_out) or response:
+        # export if file doesn't exist
+        if not os.path.exists(f_out):
             self._export_all(f_out)
+            return
+        title = "Confirmation"
+        msg = (f"The file {f_out} already exists.\n\n"
+               "Yes: append only the rows that are not in it yet\n"
+               "No: overwrite it with all the rows\n"
+               "Cancel: do not export")
+        # pop append/overwrite window (None if cancelled)
+        response = messagebox.askyesnocancel(title, msg, parent=self)
+        if response is not None:
+            self._export_all(f_out, append=response)
     
     def importData(self, list_in, format_dict, output_dir=None):
         """Function to import data contained in list_in into the input listbox."""
         
-        # update the relevant data list
-        self.list_in = list_in
-        # update the relevant StringVar
-        self.listvar_in.set(self.list_in)
         # update the max lengths for display of fields
         self.desc_len = format_dict['desc_len']
         self.cat_len = format_dict['cat_len']
-        # update the path where to save the output file
+        # register the rows, the header and separator lines become decorations of the input view
+        self._add_rows([row for row in list_in if isTransaction(row)])
+        self.header_line = list_in[0]
+        # the empty line at the end is shown by the view itself
+        slots = [row.rid if isTransaction(row) else row for row in list_in if row != ""]
+        self.list_in.reset(slots, [type(item) is not int or self.in_output[item] == 0 for item in slots])
+        self.search_index.build()
+        # update the rows shown by the listbox
+        self.listbox_in.set_items(self.list_in)
+        self._apply_filter()
+        # update the path where to save the output file, and restore the last session on it
         if output_dir is not None:
             self.output_dir = output_dir
+            self._restore_session()
+
+    def importDataAsync(self, input_dir, desc_len=50, cat_len=20, workers=1, cache=None, duplicates="flag",
+                        rules=None, watch=False, history=None):
+        """Function to import the data from input_dir in a background thread.
+        Parsed rows are added to the input listbox in batches while the GUI stays responsive.
+        If a ParseCache is given, only the files that changed since the last run are parsed.
+        Rows repeated across files are dropped, flagged or kept depending on duplicates.
+        If a RuleEngine is given, it sets the category of the rows as they are imported.
+        With watch, input_dir is polled for new, modified or removed files once the import is done.
+        If a HistoryStore is given, the imported rows and the category changes are saved to it."""
+        
+        # update the max lengths for display of fields
+        self.desc_len = desc_len
+        self.cat_len = cat_len
+        # update the path where to save the output file
+        self.output_dir = input_dir
+        # start with only the header, the rows are added as they come in
+        header_line, sep_line = formatLines(desc_len, cat_len)
+        self.header_line = header_line
+        self.list_in.reset([header_line, sep_line], [1, 1])
+        self.listbox_in.set_items(self.list_in)
+        # get the files to import and set up the progress indicator
+        files = listInputFiles(input_dir, output_file=self.f_out)
+        self.watch = watch
+        self.watch_files = [os.path.basename(input_file) for input_file in files]
+        self.file_rids = {name: [] for name in self.watch_files}
+        self.sep_line = sep_line
+        if watch:
+            # files changed during the import are picked up by the first poll
+            self.watch_stats = scanInputFiles(input_dir, output_file=self.f_out)
+        self.import_files = 0
+        self.skipped_files = []
+        self.import_rows = 0
+        self.import_start = time.perf_counter()
+        self.dup_filter = DuplicateFilter(duplicates)
+        self.cache = cache
+        self.rules = rules
+        self.history = history
+        self.progress_bar.config(maximum=max(len(files), 1), value=0)
+        self._update_progress(len(files))
+        # parse the files in a worker thread, which passes the rows back through a queue
+        self.import_queue = queue.Queue()
+        worker = threading.Thread(target=self._import_worker, args=(files, desc_len, workers, cache), daemon=True)
+        worker.start()
+        self.after(self.poll_ms, self._poll_import, len(files), sep_line)
+
+    @STATS.timed("ingest")
+    def importDataLazy(self, input_dir, desc_len=50, cat_len=20, rules=None):
+        """Function to import the data from input_dir without parsing it: each file is memory-mapped and
+        indexed by row offsets, and the rows are parsed when displayed, moved, filtered or exported.
+        Meant for very large statements. The duplicates check, the session journal and the watch mode
+        need every row up front, so they are not available; the first filter or selection parses all rows."""
+        
+        self.desc_len = desc_len
+        self.cat_len = cat_len
+        self.output_dir = input_dir
+        files = listInputFiles(input_dir, output_file=self.f_out)
+        self.skipped_files = []
+        try:
+            mapped = []
+            for input_file in files:
+                with STATS.timer("index_file"):
+                    try:
+                        mapped.append(MappedCSV(input_file, desc_len=desc_len))
+                    except UnsupportedFormatError:
+                        self.skipped_files.append(os.path.basename(input_file))
+        except (OSError, ValueError) as exc:
+            messagebox.showerror("Import error", f"Could not import the input data:\n{exc}", parent=self)
+            return
+        # the views and the search index read the rows from the lazy table
+        self.lazy = True
+        self.rules = rules
+        self.rows = LazyRows(mapped, rules=rules)
+        self.list_in.rows = self.list_out.rows = self.search_index.rows = self.rows
+        self.in_output = bytearray(len(self.rows))
+        header_line, sep_line = formatLines(desc_len, cat_len)
+        self.header_line = header_line
+        self.sep_line = sep_line
+        slots = [header_line, sep_line]
+        for rids in self.rows.file_ranges():
+            slots.extend(rids)
+            slots.append(sep_line)
+        self.list_in.reset(slots, [1] * len(slots))
+        self.list_out.reset([], [])
+        self.listbox_in.set_items(self.list_in)
+        self.listbox_out.set_items(self.list_out)
+        self.import_files = len(files)
+        self.import_rows = len(self.rows)
+        self.progress_bar.config(maximum=max(len(files), 1), value=len(files))
+        self._update_progress(len(files), finished=True)
+    
+    @STATS.timed("ingest")
+    def importHistory(self, history, date_range=(None, None), desc_len=50, cat_len=20):
+        """Function to import the rows of a date range (inclusive, either end may be None) from a HistoryStore,
+        instead of the csv files of a folder. Category changes are saved back to the store, and the output
+        file is written next to it."""
+        
+        rows = history.query(date_range)
+        header_line, sep_line = formatLines(desc_len, cat_len)
+        self.history = history
+        self.importData([header_line, sep_line, *rows, sep_line, ""], {"desc_len": desc_len, "cat_len": cat_len})
+        self.output_dir = os.path.dirname(os.path.abspath(history.path))
+        self.import_rows = len(rows)
+        first, last = date_range
+        self.progress_label.config(text=f"Loaded {len(rows)} rows from {first or 'the start'} to {last or 'the end'} "
+                                        f"from {os.path.basename(history.path)}")
+    
+    def _save_history(self, rids):
+        """Function to add the rows given by rid to the history store, if any (rows already in it are kept).
+        Rows flagged as duplicates are copies of rows of another file, so they are left out."""
+        
+        if self.history is None:
+            return
+        keys = self.row_keys.keys
+        rows = self.rows
+        rids = [rid for rid in rids if not rows[rid].dup]
+        self._write_history(self.history.addRows, [keys[rid] for rid in rids], [rows[rid] for rid in rids])
+    
+    def _write_history(self, write, *args):
+        """Function to write to the history store, which is dropped for the rest of the session if it fails."""
+        
+        try:
+            write(*args)
+        except sqlite3.Error as exc:
+            self.history = None
+            messagebox.showerror("History error", f"Could not save to the history, it is off for this session:\n{exc}",
+                                 parent=self)
+    
+    def _index_rows(self):
+        """Function to add all the rows to the search and merchant indexes, in lazy mode (parses all the rows, once)."""
+        
+        if self.lazy and len(self.search_index.row_desc) < len(self.rows):
+            self.search_index.add(self.rows)
+        if self.lazy and len(self.merchant_index) < len(self.rows):
+            self.merchant_index.add(self.rows)
+    
+    def _import_worker(self, files, desc_len, workers, cache):
+        """Function running in the worker thread: parse the files and put the rows on the queue."""
+        
+        try:
+            for idx, rows, file_done in iterInputData(files, desc_len=desc_len, workers=workers, cache=cache):
+                if rows is None:
+                    self.import_queue.put(("skipped", os.path.basename(files[idx]), True))
+                    continue
+                # named, so that the copies of the file can be forgotten if it changes in watch mode
+                rows = self.dup_filter(rows, file_done, os.path.basename(files[idx]))
+                if self.rules is not None:
+                    self.rules.categorize(rows)
+                self.import_queue.put(("rows", rows, file_done))
+        except Exception as exc:
+            self.import_queue.put(("error", exc, True))
+        else:
+            self.import_queue.put(("done", None, True))
+
+    def _poll_import(self, num_files, sep_line):
+        """Function to move the rows from the import queue into the input listbox.
+        Reschedules itself with after() until the worker thread is done."""
+        
+        new_rows = []
+        finished = False
+        done = False
+        while True:
+            try:
+                kind, payload, file_done = self.import_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "rows":
+                self._add_rows(payload)
+                # files come in order, the rows belong to the file currently being imported
+                self.file_rids[self.watch_files[self.import_files]].extend(row.rid for row in payload)
+                new_rows.extend(payload)
+                self.import_rows += len(payload)
+                # add a line to separate between the different data sources
+                if file_done:
+                    new_rows.append(sep_line)
+                    self.import_files += 1
+            elif kind == "skipped":
+                # unsupported csv format: the file adds no rows (and no separator line)
+                self.skipped_files.append(payload)
+                self.import_files += 1
+            elif kind == "error":
+                finished = True
+                messagebox.showerror("Import error", f"Could not import the input data:\n{payload}", parent=self)
+                break
+            else:
+                finished = done = True
+                break
+        # add the new rows at the end of the input view; only the rows in view are rendered
+        if new_rows:
+            for item in new_rows:
+                self.list_in.append(item.rid if isTransaction(item) else item)
+            # a filtered view is only updated once the import is done, not on every poll
+            if self.view_in is None:
+                self.listbox_in.invalidate(len(self.list_in) - len(new_rows) - 1)
+        # all rows are imported, replay the journal of the last session over them
+        if done:
+            if STATS.enabled:
+                STATS.add("ingest", time.perf_counter() - self.import_start)
+            # sorted date/amount arrays of the search index, so that the first query is a plain lookup
+            self.search_index.build()
+            if self.view_in is not None:
+                self._apply_filter()
+            # the skipped files have no block in the input list (they are checked again if they change)
+            for name in self.skipped_files:
+                self.watch_files.remove(name)
+                del self.file_rids[name]
+            self._restore_session()
+            self._save_history(range(len(self.rows)))
+            if self.watch:
+                self.after(self.watch_ms, self._poll_watch)
+        self._update_progress(num_files, finished=finished)
+        if not finished:
+            self.after(self.poll_ms, self._poll_import, num_files, sep_line)
+
+    def _update_progress(self, num_files, finished=False):
+        """Function to update the progress bar and label of the background import."""
+        
+        self.progress_bar.config(value=self.import_files)
+        status = "Imported" if finished else "Importing:"
+        text = f"{status} {self.import_files}/{num_files} files, {self.import_rows} rows"
+        # number of duplicates found across files
+        if self.dup_filter is not None and self.dup_filter.num_duplicates:
+            action = "dropped" if self.dup_filter.mode == "drop" else "flagged"
+            text += f", {self.dup_filter.num_duplicates} duplicates {action}"
+        # files not imported because their format is not supported
+        if self.skipped_files:
+            text += f", {len(self.skipped_files)} skipped (unsupported format: {', '.join(self.skipped_files)})"
+        # number of rows moved back to the output list from the last session
+        if self.restored_rows:
+            text += f", {self.restored_rows} rows restored from last session"
+        self.progress_label.config(text=text)
+
+    def _poll_watch(self):
+        """Function to check input_dir for new, modified or removed csv files and update the input list.
+        Reschedules itself with after() while watch mode is on."""
+        
+        if not self.watch:
+            return
+        try:
+            stats = scanInputFiles(self.output_dir, output_file=self.f_out)
+        except OSError:
+            # folder temporarily not available, check again at the next poll
+            stats = self.watch_stats
+        changed = sorted(name for name, stat in stats.items() if self.watch_stats.get(name) != stat)
+        removed = sorted(name for name in self.watch_stats if name not in stats)
+        if changed or removed:
+            # the next poll is scheduled once the changed files are imported
+            self._update_files(changed, removed, stats)
+            return
+        self.after(self.watch_ms, self._poll_watch)
+
+    def _update_files(self, changed, removed, stats):
+        """Function to retract the rows of the removed files and import the new or modified files in a background
+        thread, like the first import (see _watch_worker). Rows already moved to the output list are left alone."""
+        
+        num_retracted = 0
+        for name in removed:
+            num_retracted += self._retract_file(name, remove=True)[0]
+            self.dup_filter.forget(name)
+            del self.watch_stats[name]
+        # the file is only checked again once it changes, e.g. when it was still being written
+        for name in changed:
+            self.watch_stats[name] = stats[name]
+        self.import_queue = queue.Queue()
+        files = [os.path.join(self.output_dir, name) for name in changed]
+        worker = threading.Thread(target=self._watch_worker, args=(files,), daemon=True)
+        worker.start()
+        self.after(self.poll_ms, self._poll_watch_import, 0, num_retracted, [])
+
+    def _watch_worker(self, files):
+        """Function running in the worker thread of watch mode: parse the new or modified files (using the cache),
+        check them for duplicates against the other files and put the rows of each whole file on the queue."""
+        
+        for input_file in files:
+            name = os.path.basename(input_file)
+            try:
+                rows = []
+                for _, batch, _ in iterInputData([input_file], desc_len=self.desc_len, cache=self.cache):
+                    if batch is None:
+                        raise UnsupportedFormatError("unsupported csv format")
+                    rows.extend(batch)
+            except Exception as exc:
+                self.import_queue.put(("failed", f"{name} ({exc})", True))
+                continue
+            # the rows of the previous version of the file are not duplicates of the new ones
+            self.dup_filter.forget(name)
+            rows = self.dup_filter(rows, True, name)
+            if self.rules is not None:
+                self.rules.categorize(rows)
+            self.import_queue.put(("file", (name, rows), True))
+        self.import_queue.put(("done", None, True))
+
+    def _poll_watch_import(self, num_added, num_retracted, failed):
+        """Function to replace the rows of the changed files by the rows parsed by the watch worker.
+        Reschedules itself with after() until the worker is done, then resumes polling input_dir."""
+        
+        done = False
+        while True:
+            try:
+                kind, payload, _ = self.import_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "file":
+                name, rows = payload
+                retracted, kept = self._retract_file(name)
+                num_retracted += retracted
+                num_added += self._splice_file(name, rows, kept)
+            elif kind == "failed":
+                failed.append(payload)
+            else:
+                done = True
+                break
+        if not done:
+            self.after(self.poll_ms, self._poll_watch_import, num_added, num_retracted, failed)
+            return
+        # rows of the files are shown in file order, with the separators of the files still there
+        self._rebuild_input()
+        if self.view_in is not None:
+            self._apply_filter()
+        self.listbox_in.invalidate()
+        text = f"Watching: {num_added} rows added, {num_retracted} rows retracted"
+        if self.dup_filter.num_duplicates:
+            action = "dropped" if self.dup_filter.mode == "drop" else "flagged"
+            text += f", {self.dup_filter.num_duplicates} duplicates {action}"
+        if failed:
+            text += f", could not import {', '.join(failed)}"
+        self.progress_label.config(text=text)
+        self.after(self.watch_ms, self._poll_watch)
+
+    def _retract_file(self, name, remove=False):
+        """Function to retract the rows of a modified (or removed) file from the input list (the input view
+        is rebuilt afterwards by _poll_watch_import). Returns the number of retracted rows and the rids of the rows of the file kept in the output list."""
+        
+        rids = self.file_rids.pop(name, [])
+        in_output = self.in_output
+        kept = [rid for rid in rids if in_output[rid] == 1]
+        retracted = {rid for rid in rids if in_output[rid] == 0}
+        for rid in retracted:
+            in_output[rid] = 2
+            self.session_cats.pop(rid, None)
+        self.row_keys.remove(retracted)
+        # a removed file goes away with its separator line, unless rows of it are still in the output list:
+        # its block stays, so that these rows have a place in the input list when moved back
+        if remove and not kept:
+            if name in self.watch_files:
+                self.watch_files.remove(name)
+        else:
+            self.file_rids[name] = kept
+        
+        return len(retracted), kept
+
+    def _splice_file(self, name, rows, kept=()):
+        """Function to add the (categorized) rows of a new or modified file to the input list, at the position of
+        the file in the file order (once the input view is rebuilt). Rows matching the rows of the file kept in the
+        output list are skipped.
+        Returns the number of added rows."""
+        
+        if kept:
+            kept_counts = Counter(duplicateKey(self.rows[rid]) for rid in kept)
+            new_rows = []
+            for row in rows:
+                key = duplicateKey(row)
+                if kept_counts[key]:
+                    kept_counts[key] -= 1
+                else:
+                    new_rows.append(row)
+            rows = new_rows
+        self._add_rows(rows)
+        self._save_history([row.rid for row in rows])
+        self.file_rids.setdefault(name, []).extend(row.rid for row in rows)
+        # new file: add its block after the block of the previous file
+        if name not in self.watch_files:
+            bisect.insort(self.watch_files, name)
+        
+        return len(rows)
+
+    def show_stats(self):
+        """Function to open a small window with the call counts and timings of the instrumented code.
+        The stats are refreshed every second while the window is open, and can be saved to a json file."""
+        
+        if self.stats_window is not None and self.stats_window.winfo_exists():
+            self.stats_window.lift()
+            return
+        self.stats_window = tk.Toplevel(self)
+        self.stats_window.title("Stats")
+        text = tk.Text(self.stats_window, font=("Courier", 10), width=70, height=20, wrap="none")
+        text.pack(fill="both", expand=True)
+        
+        def render():
+            text.config(state="normal")
+            text.delete("1.0", tk.END)
+            text.insert("1.0", STATS.formatReport())
+            text.config(state="disabled")
+        
+        def refresh():
+            # stop refreshing once the window is closed
+            if text.winfo_exists():
+                render()
+                self.after(1000, refresh)
+        
+        def save():
+            path = filedialog.asksaveasfilename(parent=self.stats_window, defaultextension=".json",
+                                                initialfile="stats.json", title="Save stats")
+            if path:
+                STATS.dump(path)
+        
+        btn_frame = tk.Frame(self.stats_window)
+        btn_frame.pack(fill="x")
+        tk.Button(btn_frame, text="Save...", command=save).pack(side="right")
+        tk.Button(btn_frame, text="Reset", command=lambda: (STATS.reset(), render())).pack(side="right")
+        refresh()
+
+    def _add_rows(self, rows):
+        """Function to register newly imported rows: assign their row ids and add them to the search and merchant indexes."""
+        
+        for row in rows:
+            row.rid = len(self.rows)
+            self.rows.append(row)
+        self.in_output.extend(bytes(len(rows)))
+        self.search_index.add(rows)
+        self.merchant_index.add(rows)
+        self.row_keys.add(rows)
+        # the date order of the output view needs to include the new rows
+        if rows:
+            self.out_dirty = True
+
+    @STATS.timed("select")
+    def _apply_selection(self):
+        """Function to select the rows of both lists matching the selection box, replacing the current selections.
+        The Move and category buttons then apply to all the matching rows."""
+        
+        try:
+            query = parseQuery(self.select_var.get())
+        except ValueError:
+            self.select_entry.config(foreground="red")
+            return
+        self.select_entry.config(foreground="black")
+        self._index_rows()
+        # an empty query clears the selections instead of selecting everything
+        rids = self.search_index.search(*query) if query != ("", (None, None), (None, None), ()) else []
+        self._select_rids(rids)
+
+    def _select_rids(self, rids):
+        """Function to select the rows given by sorted rids in both lists, replacing the current selections."""
+        
+        view_in = self.list_in if self.view_in is None else self.view_in
+        if isinstance(view_in, RowView):
+            indices_in = view_in.indices_of(rids)
+        else:
+            wanted = set(rids)
+            indices_in = [i for i, item in enumerate(view_in) if isTransaction(item) and item.rid in wanted]
+        indices_out = self.list_out.indices_of(rids)
+        self.listbox_in.select_indices(indices_in)
+        self.listbox_out.select_indices(indices_out)
+        if rids:
+            self.progress_label.config(text=f"Selected {len(indices_in)} input and {len(indices_out)} output rows")
+
+    def _selected_rids(self, listbox=None):
+        """Function to get the rids of the rows selected in a listbox, or in both listboxes if None."""
+        
+        rids = []
+        if listbox in (None, self.listbox_in):
+            view_in = self.list_in if self.view_in is None else self.view_in
+            rids.extend(row.rid for row in self._rows_at(view_in, self.listbox_in.curselection()))
+        if listbox in (None, self.listbox_out):
+            rids.extend(row.rid for row in self._rows_at(self.list_out, self.listbox_out.curselection()))
+        return rids
+
+    def _merchant_rids(self, rids):
+        """Function to get the sorted rids of all the rows (not retracted) of the merchants of the given rows."""
+        
+        self._index_rows()
+        in_output = self.in_output
+        return [rid for rid in self.merchant_index.rowsOf(rids) if in_output[rid] != 2]
+
+    def _merchant_label(self, rids):
+        """Function to get the name shown for the merchants of the given rows (or their number if several)."""
+        
+        merchants = {self.merchant_index.merchantOf(rid) for rid in rids}
+        return merchants.pop() if len(merchants) == 1 else f"{len(merchants)} merchants"
+
+    @STATS.timed("select")
+    def select_merchant(self, rids):
+        """Function to select all the rows of the merchants of the given rows, in both lists."""
+        
+        if not rids:
+            return
+        self._select_rids(self._merchant_rids(rids))
+
+    @STATS.timed("change_category")
+    def set_merchant_category(self, rids, category):
+        """Function to set the category of all the rows of the merchants of the given rows (in both lists),
+        as one action that can be undone."""
+        
+        if not rids:
+            return
+        merchant_rids = self._merchant_rids(rids)
+        label = self._merchant_label(rids)
+        rids = merchant_rids
+        old_cats = [self.rows[rid].category for rid in rids]
+        new_cats = [category] * len(rids)
+        self._set_categories(rids, new_cats)
+        self._record_action(("cat", rids, new_cats, old_cats))
+        self.progress_label.config(text=f"Set the category of {len(rids)} rows of {label} to {category}")
+
+    def _show_merchant_menu(self, event, listbox):
+        """Function to open the merchant menu on the row under the mouse (selected first, if it is not)."""
+        
+        index = listbox.nearest(event.y)
+        if index is None:
+            return
+        if index not in listbox.selected:
+            listbox.select_indices([index])
+        rids = self._selected_rids(listbox)
+        if not rids:
+            return
+        self._index_rows()
+        label = self._merchant_label(rids)
+        menu = tk.Menu(self, tearoff=0)
+        menu.add_command(label=f"Select all from {label}", command=lambda: self.select_merchant(rids))
+        cat_menu = tk.Menu(menu, tearoff=0)
+        for cat in self.categories:
+            cat_menu.add_command(label=cat, command=lambda cat=cat: self.set_merchant_category(rids, cat))
+        menu.add_cascade(label=f"Set category for {label}", menu=cat_menu)
+        menu.tk_popup(event.x_root, event.y_root)
+
+    @STATS.timed("filter")
+    def _apply_filter(self):
+        """Function to show only the rows of the input list matching the filter box.
+        The matching rows come from the search index, in the order they were imported."""
+        
+        try:
+            query = parseQuery(self.filter_var.get())
+        except ValueError:
+            # incomplete or malformed range, keep the current rows until the query is valid
+            self.filter_entry.config(foreground="red")
+            return
+        self.filter_entry.config(foreground="black")
+        if query == ("", (None, None), (None, None), ()):
+            if self.view_in is not None:
+                self.view_in = None
+                self.listbox_in.set_items(self.list_in)
+            return
+        self._index_rows()
+        rids = self.search_index.search(*query)
+        rows = self.rows
+        in_output = self.in_output
+        # keep the header line and the empty line at the end, as in the full list
+        self.view_in = [self.list_in[0]] + [rows[rid] for rid in rids if not in_output[rid]] + [""]
+        self.listbox_in.set_items(self.view_in)